@@ -0,0 +1,66 @@
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import router
+from rest_framework_simplejwt.authentication import JWTAuthentication,JWTStatelessUserAuthentication
+from rest_framework_simplejwt.exceptions import InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+from .revocation import is_revoked
+
+
+# short, so changes made outside the user views (e.g. the admin site) still show up quickly
+USER_CACHE_TIMEOUT = 60
+# what the permission classes read on every request; the rest of the user is loaded on demand
+CACHED_USER_FIELDS = ['id','username','is_active','is_staff','is_superuser']
+
+
+def _user_key(user_id):
+    return f'authon:user:{user_id}'
+
+
+def invalidate_user(user_id):
+    """Drop the cached user so the next request with its token loads it again."""
+    cache.delete(_user_key(user_id))
+
+
+class RevocationCheckMixin:
+    """Rejects tokens whose jti was revoked or that were issued before their user's cutoff.
+
+    Both checks are in memory unless the Bloom filter hits.
+    """
+
+    def get_validated_token(self,raw_token):
+        token = super().get_validated_token(raw_token)
+        if is_revoked(token):
+            raise InvalidToken('Token has been revoked')
+        return token
+
+
+class CachedJWTAuthentication(RevocationCheckMixin,JWTAuthentication):
+    """JWTAuthentication that keeps the resolved user in the cache for USER_CACHE_TIMEOUT seconds.
+
+    Saves the auth_user lookup on every request but the first of each window. Only the
+    CACHED_USER_FIELDS are cached: request.user is rebuilt with every other field deferred,
+    so e.g. the password or the names are loaded when first read and never served stale.
+    Views that change the account load it fresh instead of saving request.user, and call
+    invalidate_user when they change or delete it.
+    """
+
+    def get_user(self,validated_token):
+        user_id = validated_token.get(api_settings.USER_ID_CLAIM)
+        if user_id is None:
+            return super().get_user(validated_token)
+        key = _user_key(user_id)
+        values = cache.get(key)
+        if values is None:
+            # raises for unknown and inactive users, so only usable accounts get cached
+            user = super().get_user(validated_token)
+            values = [getattr(user,field) for field in CACHED_USER_FIELDS]
+            cache.set(key,values,USER_CACHE_TIMEOUT)
+        return User.from_db(router.db_for_read(User),CACHED_USER_FIELDS,values)
+
+
+# opt-in for read-only endpoints that only need request.user.id: request.user is a TokenUser
+# built from the token's claims and nothing is loaded at all. A deleted or deactivated account
+# keeps access to these endpoints until its access token expires.
+class TokenUserAuthentication(RevocationCheckMixin,JWTStatelessUserAuthentication):
+    pass
@@ -0,0 +1,30 @@
+from django.contrib.auth import get_user_model
+from django.contrib.auth.backends import ModelBackend
+from .authentication import invalidate_user
+from .hashing import hash_password,verify_password
+
+UserModel = get_user_model()
+
+
+class PooledModelBackend(ModelBackend):
+    """ModelBackend that checks passwords in the hashing pool and rehashes outdated ones on login."""
+
+    def authenticate(self,request,username=None,password=None,**kwargs):
+        if username is None:
+            username = kwargs.get(UserModel.USERNAME_FIELD)
+        if username is None or password is None:
+            return
+        try:
+            user = UserModel._default_manager.get_by_natural_key(username)
+        except UserModel.DoesNotExist:
+            # hash once anyway so a missing user isn't told apart by the response time
+            hash_password(password)
+            return
+        valid,needs_rehash = verify_password(password,user.password)
+        if not valid or not self.user_can_authenticate(user):
+            return
+        if needs_rehash:
+            user.password = hash_password(password)
+            user.save(update_fields=['password'])
+            invalidate_user(user.id)
+        return user
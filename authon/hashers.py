@@ -0,0 +1,46 @@
+import base64
+import hashlib
+from django.conf import settings
+from django.contrib.auth.hashers import PBKDF2PasswordHasher,ScryptPasswordHasher
+
+
+def scrypt_maxmem(n,r,p):
+    """Memory limit to hand hashlib.scrypt for these parameters.
+
+    scrypt needs about 128 * n * r bytes per lane; the default limit (maxmem=0) is
+    OpenSSL's 32 MiB, which N = 2 ** 15 at r = 8 already exceeds.
+    """
+    return 128 * n * r * p + 2 ** 20
+
+
+class TunablePBKDF2PasswordHasher(PBKDF2PasswordHasher):
+    """PBKDF2-SHA256 with the iteration count taken from PASSWORD_HASH_ITERATIONS.
+
+    Same algorithm name as Django's hasher, so existing hashes keep verifying; a hash
+    made with another count is upgraded the next time its user logs in.
+    """
+
+    @property
+    def iterations(self):
+        return getattr(settings,'PASSWORD_HASH_ITERATIONS',PBKDF2PasswordHasher.iterations)
+
+
+class TunableScryptPasswordHasher(ScryptPasswordHasher):
+    """scrypt with the work factor (N, a power of two) taken from PASSWORD_SCRYPT_WORK_FACTOR."""
+
+    @property
+    def work_factor(self):
+        return getattr(settings,'PASSWORD_SCRYPT_WORK_FACTOR',ScryptPasswordHasher.work_factor)
+
+    def encode(self,password,salt,n=None,r=None,p=None):
+        # ScryptPasswordHasher.encode with maxmem sized for the hash's own parameters, which for
+        # an older hash may be larger than the current work factor
+        self._check_encode_args(password,salt)
+        n = n or self.work_factor
+        r = r or self.block_size
+        p = p or self.parallelism
+        hash_ = hashlib.scrypt(
+            password.encode(),salt=salt.encode(),n=n,r=r,p=p,maxmem=scrypt_maxmem(n,r,p),dklen=64,
+        )
+        hash_ = base64.b64encode(hash_).decode('ascii').strip()
+        return '%s$%d$%s$%d$%d$%s' % (self.algorithm,n,salt,r,p,hash_)
@@ -0,0 +1,77 @@
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from django.conf import settings
+from django.contrib.auth import hashers
+
+
+_pool = None
+_slots = None
+_pool_lock = threading.Lock()
+
+
+def _init_worker():
+    # spawned (not forked) workers start without Django
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE','ecommerce.settings')
+    import django
+    django.setup()
+
+
+def _make_password(password):
+    return hashers.make_password(password)
+
+
+def _check_password(password,encoded):
+    return hashers.check_password(password,encoded)
+
+
+def _needs_rehash(encoded):
+    # decided here rather than in a worker: it only parses the hash, and it follows this process's settings
+    preferred = hashers.get_hasher('default')
+    return hashers.identify_hasher(encoded).algorithm != preferred.algorithm or preferred.must_update(encoded)
+
+
+def pool_size():
+    size = getattr(settings,'PASSWORD_HASH_POOL_SIZE',None)
+    if size is None:
+        return os.cpu_count() or 1
+    return size
+
+
+def _get_pool():
+    global _pool,_slots
+    with _pool_lock:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(max_workers=pool_size(),initializer=_init_worker)
+            # at most this many hashes queued or running; further callers wait for a slot
+            _slots = threading.BoundedSemaphore(pool_size() * 2)
+        return _pool,_slots
+
+
+def _run(function,*args):
+    if not pool_size():
+        return function(*args)
+    pool,slots = _get_pool()
+    with slots:
+        return pool.submit(function,*args).result()
+
+
+def hash_password(password):
+    """make_password run in the hashing pool (inline when PASSWORD_HASH_POOL_SIZE is 0)."""
+    return _run(_make_password,password)
+
+
+def verify_password(password,encoded):
+    """check_password run in the hashing pool; returns (valid, needs_rehash).
+
+    needs_rehash is true when the preferred hasher or its cost changed since `encoded` was made.
+    """
+    if not encoded or not hashers.is_password_usable(encoded):
+        return False,False
+    try:
+        needs_rehash = _needs_rehash(encoded)
+    except ValueError:
+        # made by a hasher that is no longer configured
+        return False,False
+    valid = _run(_check_password,password,encoded)
+    return valid,valid and needs_rehash
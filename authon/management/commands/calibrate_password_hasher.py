@@ -0,0 +1,58 @@
+import time
+from django.contrib.auth.hashers import PBKDF2PasswordHasher,ScryptPasswordHasher
+from django.core.management.base import BaseCommand,CommandError
+from authon.hashers import scrypt_maxmem
+
+
+def _timed(hasher,rounds=3):
+    """Best of `rounds` single-hash timings, in milliseconds."""
+    salt = hasher.salt()
+    best = None
+    for _ in range(rounds):
+        start = time.perf_counter()
+        hasher.encode('calibration-password',salt)
+        elapsed = (time.perf_counter() - start) * 1000
+        best = elapsed if best is None else min(best,elapsed)
+    return best
+
+
+class Command(BaseCommand):
+    help = "Measure the password hashers on this machine and suggest the cost settings for a target hashing time"
+
+    def add_arguments(self,parser):
+        parser.add_argument('--target-ms',type=float,default=250,
+                            help='Time one hash should take, in milliseconds (default 250)')
+        parser.add_argument('--algorithm',choices=['pbkdf2_sha256','scrypt'],default='pbkdf2_sha256',
+                            help='Hasher to calibrate (default pbkdf2_sha256)')
+
+    def handle(self,*args,**options):
+        target = options['target_ms']
+        if target <= 0:
+            raise CommandError('--target-ms must be positive')
+        if options['algorithm'] == 'scrypt':
+            setting,value,took = self._scrypt(target)
+        else:
+            setting,value,took = self._pbkdf2(target)
+        self.stdout.write(f'{setting} = {value}  # {took:.0f} ms per hash on this machine')
+        self.stdout.write(self.style.SUCCESS(f'Put this in settings.py to target {target:.0f} ms per hash'))
+
+    def _pbkdf2(self,target):
+        # the cost is linear in the iteration count: measure once, scale, then check
+        hasher = PBKDF2PasswordHasher()
+        hasher.iterations = 100_000
+        per_iteration = _timed(hasher) / hasher.iterations
+        hasher.iterations = max(10_000,int(target / per_iteration) // 1000 * 1000)
+        return 'PASSWORD_HASH_ITERATIONS',hasher.iterations,_timed(hasher)
+
+    def _scrypt(self,target):
+        # N must be a power of two: take the largest one that stays within the target
+        hasher = ScryptPasswordHasher()
+        hasher.work_factor = 2 ** 12
+        best = hasher.work_factor,_timed(hasher)
+        while True:
+            hasher.work_factor *= 2
+            hasher.maxmem = scrypt_maxmem(hasher.work_factor,hasher.block_size,hasher.parallelism)
+            took = _timed(hasher)
+            if took > target or hasher.work_factor > 2 ** 20:
+                return 'PASSWORD_SCRYPT_WORK_FACTOR',f'2 ** {best[0].bit_length() - 1}',best[1]
+            best = hasher.work_factor,took
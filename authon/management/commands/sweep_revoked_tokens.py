@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+from authon.revocation import sweep_expired_tokens
+
+
+class Command(BaseCommand):
+    help = "Delete revoked-token records whose tokens have expired anyway (run periodically)"
+
+    def add_arguments(self,parser):
+        parser.add_argument('--batch-size',type=int,default=1000,
+                            help='Number of records deleted per statement (default 1000)')
+
+    def handle(self,*args,**options):
+        removed = sweep_expired_tokens(options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'Removed {removed} expired revoked tokens'))
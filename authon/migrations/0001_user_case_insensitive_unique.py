@@ -0,0 +1,23 @@
+# Generated by Django 5.1 on 2026-10-18 21:02
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("auth", "0012_alter_user_first_name_max_length"),
+    ]
+
+    # registration leaves uniqueness to these indexes instead of looking the values up first;
+    # blank emails (e.g. users made with createsuperuser) are left out of the email index
+    operations = [
+        migrations.RunSQL(
+            sql="CREATE UNIQUE INDEX auth_user_username_ci_uniq ON auth_user (LOWER(username))",
+            reverse_sql="DROP INDEX auth_user_username_ci_uniq",
+        ),
+        migrations.RunSQL(
+            sql="CREATE UNIQUE INDEX auth_user_email_ci_uniq ON auth_user (LOWER(email)) WHERE email <> ''",
+            reverse_sql="DROP INDEX auth_user_email_ci_uniq",
+        ),
+    ]
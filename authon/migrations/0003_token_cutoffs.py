@@ -0,0 +1,35 @@
+# Generated by Django 5.1 on 2026-10-18 21:08
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("auth", "0012_alter_user_first_name_max_length"),
+        ("authon", "0002_revoked_tokens"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="TokenCutoff",
+            fields=[
+                (
+                    "user",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        primary_key=True,
+                        related_name="token_cutoff",
+                        serialize=False,
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+                ("tokens_valid_after", models.DateTimeField(db_index=True)),
+            ],
+            options={
+                "db_table": "token_cutoffs",
+            },
+        ),
+    ]
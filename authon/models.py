@@ -1,3 +1,26 @@
 from django.db import models
+from django.contrib.auth.models import User
+from django.utils import timezone
 
 # Create your models here.
+
+
+class RevokedToken(models.Model):
+    # jti of a JWT that must no longer be accepted; kept until the token would have expired anyway
+    jti = models.CharField(max_length=255,unique=True)
+    user = models.ForeignKey(User,on_delete=models.CASCADE,null=True)
+    expires_at = models.DateTimeField(db_index=True)
+    revoked_at = models.DateTimeField(default=timezone.now,db_index=True)
+
+    class Meta:
+        db_table = "revoked_tokens"
+
+
+class TokenCutoff(models.Model):
+    # every token of `user` issued before tokens_valid_after is refused, e.g. after a password change;
+    # whole seconds, like the iat claim it is compared with
+    user = models.OneToOneField(User,on_delete=models.CASCADE,primary_key=True,related_name='token_cutoff')
+    tokens_valid_after = models.DateTimeField(db_index=True)
+
+    class Meta:
+        db_table = "token_cutoffs"
@@ -0,0 +1,190 @@
+import hashlib
+import math
+import threading
+import time
+from datetime import datetime,timedelta,timezone as dt_timezone
+from django.db import transaction
+from django.utils import timezone
+from rest_framework_simplejwt.settings import api_settings
+from .models import RevokedToken,TokenCutoff
+
+# how often a worker looks for newly revoked jtis, and how far back each look reaches: the overlap
+# covers revocations that commit after a later one was already read, and small clock differences
+REFRESH_INTERVAL = 5
+REFRESH_OVERLAP = timedelta(seconds=30)
+# full rebuilds drop the jtis of expired tokens
+REBUILD_INTERVAL = 60 * 60
+MIN_CAPACITY = 10_000
+FALSE_POSITIVE_RATE = 0.001
+# changing any of these ends every session the user has open
+SESSION_FIELDS = ('password','is_active','is_staff','is_superuser')
+
+
+def _token_lifetime():
+    # a cutoff older than this can't refuse anything: every token issued before it has expired
+    return max(api_settings.ACCESS_TOKEN_LIFETIME,api_settings.REFRESH_TOKEN_LIFETIME)
+
+
+class BloomFilter:
+    """Fixed-size set of strings with no false negatives and about `error_rate` false positives at `capacity` items."""
+
+    def __init__(self,capacity,error_rate=FALSE_POSITIVE_RATE):
+        self.capacity = capacity
+        self.size = math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2)
+        self.hashes = max(1,round(self.size / capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+        self.count = 0
+
+    def _positions(self,item):
+        # double hashing: k positions from the two halves of one digest
+        digest = hashlib.blake2b(item.encode(),digest_size=16).digest()
+        first = int.from_bytes(digest[:8],'little')
+        step = int.from_bytes(digest[8:],'little') | 1
+        return [(first + i * step) % self.size for i in range(self.hashes)]
+
+    def add(self,item):
+        added = False
+        for position in self._positions(item):
+            mask = 1 << (position & 7)
+            if not self.bits[position >> 3] & mask:
+                self.bits[position >> 3] |= mask
+                added = True
+        # only count items that weren't in yet, so re-reading the overlap doesn't inflate it
+        if added:
+            self.count += 1
+
+    def __contains__(self,item):
+        return all(self.bits[position >> 3] & (1 << (position & 7)) for position in self._positions(item))
+
+
+class RevocationList:
+    """This worker's Bloom filter of revoked jtis and map of per-user cutoffs, kept in step with
+    the revoked_tokens and token_cutoffs tables.
+
+    A jti that misses the filter is not revoked, decided without a query; only a hit is
+    confirmed against the table. Cutoffs are few, so they are held exactly.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._filter = None
+        self._cutoffs = {}
+        self._synced_at = None
+        self._built = 0
+        self._checked = 0
+
+    def _rebuild(self):
+        started = timezone.now()
+        jtis = list(RevokedToken.objects.filter(expires_at__gt = started).values_list('jti',flat=True))
+        bloom = BloomFilter(max(MIN_CAPACITY,2 * len(jtis)))
+        for jti in jtis:
+            bloom.add(jti)
+        self._filter = bloom
+        self._cutoffs = dict(
+            TokenCutoff.objects.filter(tokens_valid_after__gt = started - _token_lifetime())
+            .values_list('user_id','tokens_valid_after')
+        )
+        self._synced_at = started
+        self._built = time.monotonic()
+
+    def _refresh(self):
+        started = timezone.now()
+        for jti in RevokedToken.objects.filter(revoked_at__gte = self._synced_at - REFRESH_OVERLAP).values_list('jti',flat=True):
+            self._filter.add(jti)
+        for user_id,cutoff in TokenCutoff.objects.filter(tokens_valid_after__gte = self._synced_at - REFRESH_OVERLAP) \
+                .values_list('user_id','tokens_valid_after'):
+            self._set_cutoff(user_id,cutoff)
+        self._synced_at = started
+        if self._filter.count > self._filter.capacity:
+            self._rebuild()
+
+    def sync(self):
+        with self._lock:
+            now = time.monotonic()
+            if self._filter is None or now - self._built > REBUILD_INTERVAL:
+                self._rebuild()
+            elif now - self._checked > REFRESH_INTERVAL:
+                self._refresh()
+            else:
+                return
+            self._checked = now
+
+    def _set_cutoff(self,user_id,cutoff):
+        if user_id not in self._cutoffs or self._cutoffs[user_id] < cutoff:
+            self._cutoffs[user_id] = cutoff
+
+    def add(self,jti):
+        with self._lock:
+            if self._filter is not None:
+                self._filter.add(jti)
+
+    def add_cutoff(self,user_id,cutoff):
+        with self._lock:
+            self._set_cutoff(user_id,cutoff)
+
+    def issued_before_cutoff(self,user_id,issued_at):
+        self.sync()
+        cutoff = self._cutoffs.get(user_id)
+        return cutoff is not None and issued_at < cutoff.timestamp()
+
+    def is_revoked(self,jti):
+        self.sync()
+        if jti not in self._filter:
+            return False
+        return RevokedToken.objects.filter(jti = jti).exists()
+
+
+revoked_tokens = RevocationList()
+
+
+def is_revoked(token):
+    """Whether `token` was revoked by jti or was issued before its user's cutoff."""
+    user_id = token.get(api_settings.USER_ID_CLAIM)
+    if user_id is not None and revoked_tokens.issued_before_cutoff(user_id,token.get('iat',0)):
+        return True
+    jti = token.get(api_settings.JTI_CLAIM)
+    return jti is not None and revoked_tokens.is_revoked(jti)
+
+
+def revoke_token(token):
+    """Stop accepting `token` (a validated simplejwt token) from now on, in every worker."""
+    jti = token.get(api_settings.JTI_CLAIM)
+    if jti is None:
+        return
+    RevokedToken.objects.bulk_create([RevokedToken(
+        jti = jti,
+        user_id = token.get(api_settings.USER_ID_CLAIM),
+        expires_at = datetime.fromtimestamp(token['exp'],tz=dt_timezone.utc),
+    )],ignore_conflicts=True)
+    revoked_tokens.add(jti)
+
+
+def session_state(user):
+    return tuple(getattr(user,field) for field in SESSION_FIELDS)
+
+
+def revoke_user_tokens(user_id):
+    """Refuse every token issued to `user_id` so far, in every worker; tokens issued from the next
+    second on (like the pair handed out with the change) are accepted.
+
+    Call it when a SESSION_FIELDS value of the user changes.
+    """
+    cutoff = timezone.now().replace(microsecond=0)
+    TokenCutoff.objects.bulk_create(
+        [TokenCutoff(user_id = user_id,tokens_valid_after = cutoff)],
+        update_conflicts=True,unique_fields=['user'],update_fields=['tokens_valid_after'],
+    )
+    transaction.on_commit(lambda: revoked_tokens.add_cutoff(user_id,cutoff))
+
+
+def sweep_expired_tokens(batch_size=1000):
+    """Delete the revoked tokens that have expired anyway, `batch_size` per statement, and the
+    cutoffs older than any token still alive."""
+    removed = 0
+    while True:
+        ids = list(RevokedToken.objects.filter(expires_at__lte = timezone.now()).values_list('id',flat=True)[:batch_size])
+        if not ids:
+            break
+        removed += RevokedToken.objects.filter(id__in = ids).delete()[0]
+    removed += TokenCutoff.objects.filter(tokens_valid_after__lte = timezone.now() - _token_lifetime()).delete()[0]
+    return removed
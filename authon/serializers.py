@@ -1,39 +1,70 @@
+from contextlib import nullcontext
 from rest_framework import serializers
 from django.contrib.auth.models import User
 from django.contrib.auth.hashers import make_password
+from .hashing import hash_password
+from .revocation import is_revoked
+from rest_framework_simplejwt.exceptions import InvalidToken
+from rest_framework_simplejwt.serializers import TokenRefreshSerializer
+from django.contrib.auth.validators import UnicodeUsernameValidator
+from django.db import IntegrityError,transaction
 
-class UserSerializer(serializers.ModelSerializer):
+
+class UniqueUserFieldsMixin:
+    """Leaves username/email uniqueness to the case-insensitive unique indexes on auth_user.
+
+    No lookup runs before the write, and two concurrent requests can't both get through;
+    a violation is reported with the same field error the lookups used to give.
+    """
+    unique_errors = {
+        'email':'A user with this e-mail already exists',
+        'username':'A user with this username already exists',
+    }
+
+    def save(self,**kwargs):
+        # a savepoint is only needed to keep an enclosing transaction usable after the error
+        savepoint = transaction.atomic() if transaction.get_connection().in_atomic_block else nullcontext()
+        try:
+            with savepoint:
+                return super().save(**kwargs)
+        except IntegrityError as ex:
+            field = 'email' if 'auth_user_email_ci_uniq' in str(ex) else 'username'
+            raise serializers.ValidationError({field:[self.unique_errors[field]]})
+
+
+class HashedPasswordUpdateMixin:
+    """Stores a changed password hashed (in the hashing pool) instead of as sent."""
+
+    def update(self,instance,validated_data):
+        if validated_data.get('password'):
+            validated_data['password'] = hash_password(validated_data['password'])
+        return super().update(instance,validated_data)
+
+
+class UserSerializer(UniqueUserFieldsMixin,serializers.ModelSerializer):
     password = serializers.CharField(write_only = True)
     def create(self,data):
         password = data.pop("password")
         user = User(**data)
-        user.set_password(password)
+        user.password = hash_password(password)
         user.save()
         return user
-    
-    def validate_email(self,email):
-        user = User.objects.filter(email = email)
-        if user :
-            raise serializers.ValidationError('A user with this e-mail already exists')
-        return email
-        
-    def validate_username(self,username):
-        user = User.objects.filter(username = username)
-        if user:
-            raise serializers.ValidationError('A user with this username already exists')
-        else :
-            return username
 
     class Meta:
         model = User
-        fields = ['id','first_name','last_name','username','email','is_staff']
+        fields = ['id','first_name','last_name','username','email','password','is_staff']
+        # registration is open to anyone, so staff status is only ever granted through update_user
+        read_only_fields = ['is_staff']
+        # without the default UniqueValidator, which would query auth_user
+        extra_kwargs = {'username':{'validators':[UnicodeUsernameValidator()]}}
 
 
 
-class UpdateUserSerializer(serializers.ModelSerializer):
+class UpdateUserSerializer(UniqueUserFieldsMixin,HashedPasswordUpdateMixin,serializers.ModelSerializer):
     class Meta:
         model = User
         fields = ['id','first_name','last_name','username','email','password','is_staff']
+        extra_kwargs = {'username':{'validators':[UnicodeUsernameValidator()]},'password':{'write_only':True}}
 
     def update_user(self,instance,validated_data):
         instance.first_name = validated_data.get('first_name',instance.first_name)
@@ -46,22 +77,11 @@ class UpdateUserSerializer(serializers.ModelSerializer):
 
 
 
-class UpdateUserProfileSerializer(serializers.ModelSerializer):
-    def validate_email(self,email):
-        user = User.objects.filter(email = email)
-        if user :
-            raise serializers.ValidationError('A user with this e-mail already exists')
-        return email
-        
-    def validate_username(self,username):
-        user = User.objects.filter(username = username)
-        if user:
-            raise serializers.ValidationError('A user with this username already exists')
-        else :
-            return username
+class UpdateUserProfileSerializer(UniqueUserFieldsMixin,HashedPasswordUpdateMixin,serializers.ModelSerializer):
     class Meta:
         model = User
         fields = ['first_name','last_name','username','email','password']
+        extra_kwargs = {'username':{'validators':[UnicodeUsernameValidator()]},'password':{'write_only':True}}
 
     def update_user(self,instance,validated_data):
         instance.first_name = validated_data.get('first_name', instance.first_name)
@@ -71,3 +91,13 @@ class UpdateUserProfileSerializer(serializers.ModelSerializer):
         password = validated_data.get('password', None)
         if password:
             instance.password = make_password(password)
+
+
+
+class RevocationAwareTokenRefreshSerializer(TokenRefreshSerializer):
+    """TokenRefreshSerializer that refuses refresh tokens revoked on logout."""
+
+    def validate(self,attrs):
+        if is_revoked(self.token_class(attrs['refresh'])):
+            raise InvalidToken('Token has been revoked')
+        return super().validate(attrs)
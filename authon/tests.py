@@ -1,3 +1,167 @@
-from django.test import TestCase
+from django.contrib.auth.hashers import check_password
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase,override_settings
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import RefreshToken
+from .hashers import TunablePBKDF2PasswordHasher,TunableScryptPasswordHasher
 
 # Create your tests here.
+
+
+@override_settings(PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'],PASSWORD_HASH_POOL_SIZE=0)
+class AuthonTestCase(TestCase):
+    client_class = APIClient
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user('bob','bob@example.com','secret-pw')
+
+    def authenticate(self,user=None,issued_ago=0):
+        refresh = RefreshToken.for_user(user or self.user)
+        # backdated past the whole second a cutoff set in this test falls into
+        refresh['iat'] -= issued_ago
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {refresh.access_token}')
+        return refresh
+
+    def refresh(self,refresh):
+        return self.client_class().post('/api/token/refresh/',{'refresh':str(refresh)},format='json')
+
+
+class CachedUserTests(AuthonTestCase):
+
+    def test_cached_user_skips_the_user_lookup(self):
+        self.authenticate()
+        self.client.get('/api/profile/')
+        # only the view's own load of the profile
+        with self.assertNumQueries(1):
+            response = self.client.get('/api/profile/')
+        self.assertEqual(response.status_code,200)
+        self.assertEqual(response.json()['email'],'bob@example.com')
+
+    def test_profile_update_does_not_write_back_the_cached_user(self):
+        self.authenticate()
+        self.client.get('/api/profile/')
+        # changed behind the cache's back, e.g. from the admin site
+        User.objects.filter(id = self.user.id).update(is_active=False,email='new@example.com')
+        response = self.client.put('/api/updateprofile/',{'first_name':'Bobby'},format='json')
+        self.assertEqual(response.status_code,200)
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.first_name,'Bobby')
+        self.assertFalse(self.user.is_active)
+        self.assertEqual(self.user.email,'new@example.com')
+
+    def test_user_writes_drop_the_cached_user(self):
+        admin = User.objects.create_user('admin','admin@example.com','secret-pw',is_staff=True)
+        self.authenticate()
+        self.client.get('/api/profile/')
+        self.authenticate(admin)
+        self.client.delete(f'/api/delete/{self.user.id}')
+        self.authenticate()
+        self.assertEqual(self.client.get('/api/profile/').status_code,401)
+
+
+class RegisterTests(AuthonTestCase):
+
+    def test_register_cannot_grant_staff(self):
+        response = self.client.post('/api/register/',{
+            'username':'mallory','email':'mallory@example.com','password':'secret-pw','is_staff':True,
+        },format='json')
+        self.assertEqual(response.status_code,201)
+        self.assertFalse(response.json()['is_staff'])
+        self.assertFalse(User.objects.get(username='mallory').is_staff)
+
+    def test_username_and_email_are_unique_ignoring_case(self):
+        body = {'username':'Bob','email':'new@example.com','password':'secret-pw'}
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post('/api/register/',body,format='json')
+        self.assertEqual(response.status_code,400)
+        # no lookup before the insert, the index reports the clash
+        self.assertEqual([query['sql'].split()[0] for query in queries if 'auth_user' in query['sql']],['INSERT'])
+        self.assertEqual(response.json(),{'username':['A user with this username already exists']})
+        response = self.client.post('/api/register/',{**body,'username':'robert','email':'BOB@example.com'},format='json')
+        self.assertEqual(response.json(),{'email':['A user with this e-mail already exists']})
+        self.assertEqual(User.objects.count(),1)
+
+    def test_profile_update_to_a_taken_email(self):
+        User.objects.create_user('alice','alice@example.com','secret-pw')
+        self.authenticate()
+        response = self.client.put('/api/updateprofile/',{'email':'Alice@Example.com'},format='json')
+        self.assertEqual(response.status_code,400)
+        self.assertEqual(User.objects.get(id = self.user.id).email,'bob@example.com')
+
+
+class PasswordHashingTests(AuthonTestCase):
+
+    @override_settings(PASSWORD_SCRYPT_WORK_FACTOR=2 ** 15)
+    def test_scrypt_past_the_default_memory_limit(self):
+        hasher = TunableScryptPasswordHasher()
+        encoded = hasher.encode('secret-pw',hasher.salt())
+        self.assertTrue(encoded.startswith('scrypt$32768$'))
+        # still verifies once the work factor is lowered again
+        with self.settings(PASSWORD_SCRYPT_WORK_FACTOR=2 ** 10):
+            self.assertTrue(hasher.verify('secret-pw',encoded))
+
+    @override_settings(PASSWORD_HASHERS=['authon.hashers.TunablePBKDF2PasswordHasher'],PASSWORD_HASH_ITERATIONS=2000)
+    def test_login_rehashes_an_outdated_hash(self):
+        hasher = TunablePBKDF2PasswordHasher()
+        User.objects.filter(id = self.user.id).update(password=hasher.encode('secret-pw',hasher.salt(),iterations=1000))
+        response = self.client.post('/api/login/',{'username':'bob','password':'secret-pw'},format='json')
+        self.assertEqual(response.status_code,200)
+        self.user.refresh_from_db()
+        self.assertTrue(self.user.password.startswith('pbkdf2_sha256$2000$'))
+        self.assertTrue(check_password('secret-pw',self.user.password))
+
+    def test_login_with_a_wrong_password_fails(self):
+        response = self.client.post('/api/login/',{'username':'bob','password':'wrong'},format='json')
+        self.assertEqual(response.status_code,401)
+
+
+class RevocationTests(AuthonTestCase):
+
+    def test_logout_revokes_the_access_and_refresh_tokens(self):
+        refresh = self.authenticate()
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post('/api/logout/',{'refresh':str(refresh)},format='json')
+        self.assertEqual(response.status_code,200)
+        self.assertEqual(self.client.get('/api/profile/').status_code,401)
+        self.assertEqual(self.client.get('/api/get_my_orders').status_code,401)
+        self.assertEqual(self.refresh(refresh).status_code,401)
+        self.assertEqual(self.refresh(RefreshToken.for_user(self.user)).status_code,200)
+
+    def test_password_change_ends_every_other_session(self):
+        other_session = self.authenticate(issued_ago=5)
+        self.authenticate(issued_ago=5)
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.put('/api/updateprofile/',{'password':'new-secret-pw'},format='json')
+        self.assertEqual(response.status_code,200)
+        self.assertEqual(self.refresh(other_session).status_code,401)
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {other_session.access_token}')
+        self.assertEqual(self.client.get('/api/get_my_orders').status_code,401)
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {response.json()["access"]}')
+        self.assertEqual(self.client.get('/api/profile/').status_code,200)
+        self.assertEqual(self.refresh(response.json()['refresh']).status_code,200)
+
+    def test_demotion_ends_the_sessions_of_the_user(self):
+        self.user.is_staff = True
+        self.user.save()
+        session = self.authenticate(issued_ago=5)
+        self.assertEqual(self.client.get('/api/getallusers/').status_code,200)
+        admin = User.objects.create_user('admin','admin@example.com','secret-pw',is_staff=True)
+        self.client.force_authenticate(admin)
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.put(f'/api/updateuser/{self.user.id}',{'is_staff':False},format='json')
+        self.assertEqual(response.status_code,200)
+        self.client.force_authenticate(None)
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {session.access_token}')
+        self.assertEqual(self.client.get('/api/getallusers/').status_code,401)
+        self.assertEqual(self.refresh(session).status_code,401)
+
+    def test_name_change_keeps_the_other_sessions(self):
+        other_session = self.authenticate(issued_ago=5)
+        self.authenticate(issued_ago=5)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.put('/api/updateprofile/',{'first_name':'Bobby'},format='json')
+        self.assertEqual(self.refresh(other_session).status_code,200)
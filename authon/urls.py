@@ -10,4 +10,5 @@ urlpatterns = [
     path('getallusers/',views.get_all_users,name='get_all_users'),
     path('updateuser/<int:id>',views.update_user,name='update_user'),
     path('updateprofile/',views.updateUserProfile,name='updateUserProfile'),
+    path('logout/',views.logout,name='logout'),
 ]
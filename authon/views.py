@@ -5,7 +5,14 @@ from rest_framework.permissions import IsAuthenticated,IsAdminUser
 from rest_framework_simplejwt.tokens import RefreshToken
 from rest_framework.response import Response
 from rest_framework import status
+from rest_framework.exceptions import ValidationError
+from django.db import transaction
 from .serializers import UserSerializer,UpdateUserSerializer,UpdateUserProfileSerializer
+from .authentication import invalidate_user
+from .revocation import revoke_token,revoke_user_tokens,session_state
+from rest_framework_simplejwt.exceptions import TokenError
+from rest_framework_simplejwt.settings import api_settings
+from store.streaming import stream_serialized,wants_stream
 from drf_yasg import openapi
 from drf_yasg.utils import swagger_auto_schema
 # Create your views here.
@@ -74,6 +81,7 @@ def delete_user(request,id):
     try:
         user = User.objects.get(id = id)
         user.delete()
+        invalidate_user(id)
         return Response({'message':'deleted successfully'},status=status.HTTP_200_OK)
     except Exception as ex:
         return Response({'error':f'{str(ex)}'},status=status.HTTP_400_BAD_REQUEST)
@@ -163,7 +171,8 @@ def get_user_by_id(request,id):
 @permission_classes([IsAuthenticated])
 def get_user_profile(request):
     try:
-        user = request.user
+        # request.user only carries the cached auth fields
+        user = User.objects.get(id = request.user.id)
         serializer = UserSerializer(user)
         return Response(serializer.data ,status=status.HTTP_200_OK)
     except Exception as ex:
@@ -179,6 +188,15 @@ def get_user_profile(request):
         "This endpoint allows administrators to retrieve a list of all registered users in the system. "
         "The response contains detailed user information such as usernames, emails, and other fields."
     ),
+    manual_parameters=[
+        openapi.Parameter(
+            'stream',
+            openapi.IN_QUERY,
+            description="Stream the users as the JSON array is serialized instead of building it in memory first",
+            type=openapi.TYPE_BOOLEAN,
+            required=False,
+        ),
+    ],
     responses={
         200: openapi.Response(
             description="List of users retrieved successfully",
@@ -216,6 +234,8 @@ def get_user_profile(request):
 def get_all_users(request):
     try:
         users = User.objects.all()
+        if wants_stream(request):
+            return stream_serialized(request,users.order_by('id'),UserSerializer)
         serializer = UserSerializer(users,many=True)
         return Response(serializer.data,status=status.HTTP_200_OK)
     except Exception as ex:
@@ -272,14 +292,21 @@ def get_all_users(request):
 @permission_classes([IsAdminUser])
 def update_user(request,id):
     try:
-        user = User.objects.get(id = id)
-        serializer = UpdateUserSerializer(data=request.data,instance=user,partial=True)
-        if serializer.is_valid():
+        with transaction.atomic():
+            user = User.objects.select_for_update().get(id = id)
+            before = session_state(user)
+            serializer = UpdateUserSerializer(data=request.data,instance=user,partial=True)
+            if not serializer.is_valid():
+                return Response(serializer.errors,status=status.HTTP_400_BAD_REQUEST)
             updated_data = serializer.save()
-            refresh = RefreshToken.for_user(updated_data)
-            return Response({'user': serializer.data,'refresh': str(refresh),'access': str(refresh.access_token)}, status=status.HTTP_200_OK)
-        else :
-            return Response(serializer.errors,status=status.HTTP_400_BAD_REQUEST)
+            # a new password or a demotion must not leave the old sessions usable
+            if session_state(updated_data) != before:
+                revoke_user_tokens(updated_data.id)
+        invalidate_user(updated_data.id)
+        refresh = RefreshToken.for_user(updated_data)
+        return Response({'user': serializer.data,'refresh': str(refresh),'access': str(refresh.access_token)}, status=status.HTTP_200_OK)
+    except ValidationError as ex:
+        return Response(ex.detail,status=status.HTTP_400_BAD_REQUEST)
     except Exception as ex:
         return Response({'error':f'{str(ex)}'})
     except User.DoesNotExist:
@@ -329,13 +356,75 @@ def update_user(request,id):
 @permission_classes([IsAuthenticated])
 def updateUserProfile(request):
     try:
-        user = request.user
-        serializer = UpdateUserProfileSerializer(data = request.data,instance=user,partial=True)
-        if serializer.is_valid():
+        with transaction.atomic():
+            # saved from a fresh, locked row: request.user is only the cached auth snapshot
+            user = User.objects.select_for_update().get(id = request.user.id)
+            before = session_state(user)
+            serializer = UpdateUserProfileSerializer(data = request.data,instance=user,partial=True)
+            if not serializer.is_valid():
+                return Response(serializer.errors,status=status.HTTP_400_BAD_REQUEST)
             updated_data = serializer.save()
-            refresh = RefreshToken.for_user(updated_data)
-            return Response({'user': serializer.data,'refresh': str(refresh),'access': str(refresh.access_token)}, status=status.HTTP_200_OK)
-        else:
-            return Response(serializer.errors,status=status.HTTP_400_BAD_REQUEST)
+            if session_state(updated_data) != before:
+                revoke_user_tokens(updated_data.id)
+        invalidate_user(updated_data.id)
+        # the new pair replaces the token this request was made with
+        if request.auth is not None:
+            revoke_token(request.auth)
+        refresh = RefreshToken.for_user(updated_data)
+        return Response({'user': serializer.data,'refresh': str(refresh),'access': str(refresh.access_token)}, status=status.HTTP_200_OK)
+    except ValidationError as ex:
+        return Response(ex.detail,status=status.HTTP_400_BAD_REQUEST)
     except Exception as ex:
-        return Response({'error':f'{str(ex)}'})
\ No newline at end of file
+        return Response({'error':f'{str(ex)}'})
+
+
+
+@swagger_auto_schema(
+    method='post',
+    operation_summary="Log out",
+    operation_description=(
+        "This endpoint revokes the access token the request is made with and, when it is sent, "
+        "the matching refresh token. Revoked tokens are refused by every endpoint and by token refresh "
+        "until they would have expired."
+    ),
+    request_body=openapi.Schema(
+        type=openapi.TYPE_OBJECT,
+        properties={
+            'refresh': openapi.Schema(type=openapi.TYPE_STRING, description="Refresh token to revoke as well"),
+        },
+    ),
+    responses={
+        200: openapi.Response(
+            description="Tokens revoked",
+            examples={
+                "application/json": {
+                    "message": "logged out"
+                }
+            }
+        ),
+        400: openapi.Response(
+            description="The refresh token is invalid or expired",
+            examples={
+                "application/json": {
+                    "error": "Token is invalid or expired"
+                }
+            }
+        ),
+    },
+    security=[{"Bearer": []}],
+)
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def logout(request):
+    refresh = request.data.get('refresh')
+    if refresh:
+        try:
+            refresh = RefreshToken(refresh)
+        except TokenError as ex:
+            return Response({'error':f'{str(ex)}'},status=status.HTTP_400_BAD_REQUEST)
+        if refresh.get(api_settings.USER_ID_CLAIM) != request.user.id:
+            return Response({'error':'the refresh token belongs to another user'},status=status.HTTP_400_BAD_REQUEST)
+        revoke_token(refresh)
+    if request.auth is not None:
+        revoke_token(request.auth)
+    return Response({'message':'logged out'},status=status.HTTP_200_OK)
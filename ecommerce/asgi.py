@@ -2,6 +2,10 @@
 ASGI config for ecommerce project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
+Serve it with an ASGI server (e.g. ``uvicorn ecommerce.asgi:application``) so the
+order events stream (store.views.order_events_stream) holds no worker per client.
+The ``?stream=true`` exports (store.streaming) hand their chunks to the ASGI server
+one at a time, so they keep streaming here too.
 
 For more information on this file, see
 https://docs.djangoproject.com/en/5.1/howto/deployment/asgi/
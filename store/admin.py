@@ -1,8 +1,7 @@
 from django.contrib import admin
-from .models import Product,Order,Review,OrderItem,Order_Products
+from .models import Product,Order,Review,OrderItem
 # Register your models here.
 admin.site.register(Product)
 admin.site.register(Review)
 admin.site.register(Order)
-admin.site.register(OrderItem)
-admin.site.register(Order_Products)
\ No newline at end of file
+admin.site.register(OrderItem)
\ No newline at end of file
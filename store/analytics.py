@@ -0,0 +1,220 @@
+from collections import defaultdict
+from datetime import timedelta
+from django.db import transaction
+from django.db.models import Case,Count,F,FloatField,IntegerField,Max,Sum,Value,When
+from django.db.models.functions import Coalesce,TruncDate
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+from .models import ArchivedOrder,ArchivedOrderItem,DailyCategorySales,DailyProductSales,DailySales,Order,OrderItem
+
+ROLLUP_GROUPS = ('day','product','category')
+DEFAULT_REPORT_DAYS = 30
+_METRICS = {'orders':IntegerField(),'units':IntegerField(),'revenue':FloatField()}
+# rows per day and key that live updates are spread over; checkouts only contend within a shard
+ROLLUP_SHARDS = 16
+
+
+def _shard(order_id):
+    return order_id % ROLLUP_SHARDS
+
+
+def _bump(model,day,shard,key_field,deltas,defaults=None):
+    """Add the per-key `deltas` ({key: {'orders','units','revenue'}}) to the rollup rows of `day` in `shard`.
+
+    Missing rows are inserted first, then every row is incremented by one CASE update.
+    """
+    defaults = defaults or {}
+    model.objects.bulk_create(
+        [model(day = day,shard = shard,**{key_field:key},**defaults.get(key,{})) for key in deltas],
+        ignore_conflicts=True,
+    )
+    model.objects.filter(day = day,shard = shard,**{f'{key_field}__in':list(deltas)}).update(**{
+        metric:F(metric) + Case(
+            *[When(**{key_field:key},then=Value(values[metric])) for key,values in deltas.items()],
+            default=Value(0),output_field=field,
+        )
+        for metric,field in _METRICS.items()
+    })
+
+
+def record_order_placed(order,lines):
+    """Add a new order to the rollups; `lines` is a list of (product, quantity, unit_price).
+
+    Call it in the transaction that creates the order so the rollups commit with it. The
+    rows it updates stay locked until then, so they are picked by order id among
+    ROLLUP_SHARDS per day rather than shared by every checkout.
+    """
+    day = timezone.localdate(order.created_at)
+    shard = _shard(order.id)
+    products = {}
+    categories = {}
+    units = 0
+    revenue = 0
+    for product,quantity,price in lines:
+        subtotal = quantity * price
+        units += quantity
+        revenue += subtotal
+        for key,deltas in ((product.id,products),(product.category or '',categories)):
+            row = deltas.setdefault(key,{'orders':1,'units':0,'revenue':0})
+            row['units'] += quantity
+            row['revenue'] += subtotal
+    DailySales.objects.bulk_create([DailySales(day = day,shard = shard)],ignore_conflicts=True)
+    DailySales.objects.filter(day = day,shard = shard).update(
+        orders = F('orders') + 1,units = F('units') + units,revenue = F('revenue') + revenue,
+    )
+    names = {product.id:{'product_name':product.name} for product,_,_ in lines}
+    _bump(DailyProductSales,day,shard,'product_id',products,names)
+    _bump(DailyCategorySales,day,shard,'category',categories)
+
+
+def record_order_paid(order):
+    """Count `order` as paid on the day of its paid_at; call once, when it flips to paid."""
+    record_orders_paid([order.id],timezone.localdate(order.paid_at))
+
+
+def record_orders_paid(order_ids,day):
+    """Count the orders in `order_ids`, all paid on `day`, in the paid totals with one aggregate and one update."""
+    revenue = OrderItem.objects.filter(order_id__in = order_ids).aggregate(
+        revenue=Coalesce(Sum(F('quantity') * F('price'),output_field=FloatField()),Value(0.0))
+    )['revenue']
+    shard = _shard(min(order_ids))
+    DailySales.objects.bulk_create([DailySales(day = day,shard = shard)],ignore_conflicts=True)
+    DailySales.objects.filter(day = day,shard = shard).update(
+        paid_orders = F('paid_orders') + len(order_ids),paid_revenue = F('paid_revenue') + revenue,
+    )
+
+
+def _line_totals(items,*group_by):
+    return items.values(*group_by).annotate(
+        line_orders=Count('order',distinct=True),
+        line_units=Coalesce(Sum('quantity'),Value(0)),
+        line_revenue=Coalesce(Sum(F('quantity') * F('price'),output_field=FloatField()),Value(0.0)),
+    ).order_by()
+
+
+def _source_totals(order_model,item_model,since):
+    """Per-day, per-product and per-category totals of the orders in `order_model` and their items."""
+    orders = order_model.objects.annotate(day=TruncDate('created_at'))
+    paid = order_model.objects.filter(is_paid = True).exclude(paid_at = None).annotate(day=TruncDate('paid_at'))
+    items = item_model.objects.annotate(day=TruncDate('order__created_at'))
+    paid_items = item_model.objects.filter(order__is_paid = True).exclude(order__paid_at = None) \
+        .annotate(day=TruncDate('order__paid_at'))
+    if since:
+        orders,paid,items,paid_items = (qs.filter(day__gte = since) for qs in (orders,paid,items,paid_items))
+
+    daily = defaultdict(lambda:defaultdict(int))
+    for row in orders.values('day').annotate(count=Count('id')).order_by():
+        daily[row['day']]['orders'] += row['count']
+    for row in _line_totals(items,'day'):
+        daily[row['day']]['units'] += row['line_units']
+        daily[row['day']]['revenue'] += row['line_revenue']
+    for row in paid.values('day').annotate(count=Count('id')).order_by():
+        daily[row['day']]['paid_orders'] += row['count']
+    for row in _line_totals(paid_items,'day'):
+        daily[row['day']]['paid_revenue'] += row['line_revenue']
+    products = {
+        (row['day'],row['product_id'],row['name'] or ''):row
+        for row in _line_totals(items.annotate(name=Coalesce('product__name','product_name')),'day','product_id','name')
+    }
+    categories = {
+        (row['day'],row['group']):row
+        for row in _line_totals(items.annotate(group=Coalesce('product__category',Value(''))),'day','group')
+    }
+    return daily,products,categories
+
+
+def _merge_lines(merged,rows):
+    for key,row in rows.items():
+        totals = merged.setdefault(key,{'orders':0,'units':0,'revenue':0})
+        totals['orders'] += row['line_orders']
+        totals['units'] += row['line_units']
+        totals['revenue'] += row['line_revenue']
+
+
+def rebuild_rollups(since=None):
+    """Recompute the rollups from orders, for every day or only from the date `since` on.
+
+    Archived orders are counted with the live ones, so days whose orders were all
+    archived keep their history. Returns the number of days rebuilt.
+    """
+    daily = defaultdict(dict)
+    products = {}
+    categories = {}
+    for order_model,item_model in ((Order,OrderItem),(ArchivedOrder,ArchivedOrderItem)):
+        source_daily,source_products,source_categories = _source_totals(order_model,item_model,since)
+        for day,values in source_daily.items():
+            for metric,value in values.items():
+                daily[day][metric] = daily[day].get(metric,0) + value
+        _merge_lines(products,source_products)
+        _merge_lines(categories,source_categories)
+    product_rows = [
+        DailyProductSales(day = day,product_id = product_id,product_name = name,**totals)
+        for (day,product_id,name),totals in products.items()
+    ]
+    category_rows = [
+        DailyCategorySales(day = day,category = category,**totals)
+        for (day,category),totals in categories.items()
+    ]
+
+    with transaction.atomic():
+        for model in (DailySales,DailyProductSales,DailyCategorySales):
+            stale = model.objects.all()
+            if since:
+                stale = stale.filter(day__gte = since)
+            stale.delete()
+        DailySales.objects.bulk_create([DailySales(day = day,**values) for day,values in daily.items()],batch_size=1000)
+        DailyProductSales.objects.bulk_create(product_rows,batch_size=1000)
+        DailyCategorySales.objects.bulk_create(category_rows,batch_size=1000)
+    return len(daily)
+
+
+def parse_report_params(query_params):
+    """Read from, to (YYYY-MM-DD, inclusive) and group from `query_params`; defaults to the last 30 days by day.
+
+    Raises ValueError with a readable message for malformed values.
+    """
+    days = {}
+    for param in ('from','to'):
+        value = query_params.get(param)
+        if value:
+            try:
+                days[param] = parse_date(value)
+            except ValueError:
+                days[param] = None
+            if days[param] is None:
+                raise ValueError(f'{param} must be a date (YYYY-MM-DD)')
+    end = days.get('to') or timezone.localdate()
+    start = days.get('from') or end - timedelta(days=DEFAULT_REPORT_DAYS - 1)
+    if start > end:
+        raise ValueError('from must not be after to')
+    group = query_params.get('group') or 'day'
+    if group not in ROLLUP_GROUPS:
+        raise ValueError(f'group must be one of {", ".join(ROLLUP_GROUPS)}')
+    return start,end,group
+
+
+def sales_report(start,end,group='day'):
+    """Sales between the dates `start` and `end` (inclusive) grouped by day, product or category.
+
+    Reads only the rollup tables, so the cost depends on the date range rather than on the order volume.
+    """
+    totals = {'total_orders':Sum('orders'),'total_units':Sum('units'),'total_revenue':Sum('revenue')}
+    if group == 'product':
+        rows = DailyProductSales.objects.filter(day__range = (start,end)).values('product_id') \
+            .annotate(product_name=Max('product_name'),**totals).order_by('-total_revenue','product_id')
+    elif group == 'category':
+        rows = DailyCategorySales.objects.filter(day__range = (start,end)).values('category') \
+            .annotate(**totals).order_by('-total_revenue','category')
+    else:
+        rows = DailySales.objects.filter(day__range = (start,end)).values('day') \
+            .annotate(total_paid_orders=Sum('paid_orders'),total_paid_revenue=Sum('paid_revenue'),**totals) \
+            .order_by('day')
+    report = []
+    for row in rows:
+        row = {key.removeprefix('total_'):value for key,value in row.items()}
+        row['revenue'] = round(row['revenue'],2)
+        if 'paid_revenue' in row:
+            row['paid_revenue'] = round(row['paid_revenue'],2)
+        row['average_order_value'] = round(row['revenue'] / row['orders'],2) if row['orders'] else 0
+        report.append(row)
+    return report
@@ -0,0 +1,55 @@
+from datetime import timedelta
+from django.db import transaction
+from django.utils import timezone
+from .models import ArchivedOrder,ArchivedOrderItem,Order,OrderItem
+
+ARCHIVE_AFTER = timedelta(days=365)
+
+_ORDER_FIELDS = (
+    'id','user_id','payment_method','is_paid','is_delivered','paid_at','delivered_at','price',
+    'shipping_price','total_price','tax_price','created_at','updated_at',
+)
+
+
+def _archive_batch(cutoff,batch_size):
+    with transaction.atomic():
+        ids = list(
+            Order.objects.filter(is_delivered = True,created_at__lt = cutoff)
+            .order_by('id').select_for_update(skip_locked=True).values_list('id',flat=True)[:batch_size]
+        )
+        if not ids:
+            return 0
+        archived = []
+        for order in Order.objects.filter(id__in = ids).values(
+            *_ORDER_FIELDS,'order_shipping__country','order_shipping__city','order_shipping__postal_code',
+        ):
+            archived.append(ArchivedOrder(
+                country = order.pop('order_shipping__country') or '',
+                city = order.pop('order_shipping__city') or '',
+                postal_code = order.pop('order_shipping__postal_code'),
+                **order,
+            ))
+        ArchivedOrder.objects.bulk_create(archived)
+        ArchivedOrderItem.objects.bulk_create([
+            ArchivedOrderItem(**item)
+            for item in OrderItem.objects.filter(order_id__in = ids)
+            .values('id','order_id','product_id','product_name','quantity','price')
+        ])
+        # removes the items and shipping addresses with the orders
+        Order.objects.filter(id__in = ids).delete()
+        return len(ids)
+
+
+def archive_delivered_orders(older_than=ARCHIVE_AFTER,batch_size=500):
+    """Move delivered orders created more than `older_than` ago into the archive tables.
+
+    Each batch is copied and deleted in its own short transaction; orders locked by
+    another request are skipped until the next run. Returns the number of orders archived.
+    """
+    cutoff = timezone.now() - older_than
+    archived = 0
+    while True:
+        moved = _archive_batch(cutoff,batch_size)
+        if not moved:
+            return archived
+        archived += moved
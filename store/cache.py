@@ -0,0 +1,71 @@
+import time
+from django.core.cache import cache
+from django.db import transaction
+
+
+PRODUCT_CACHE_TIMEOUT = 60 * 15
+_STATS_KEYS = {
+    'hits':'store:product_cache:hits',
+    'misses':'store:product_cache:misses',
+}
+
+
+def _version_key(pk):
+    return f'store:product:{pk}:version'
+
+
+def _new_version():
+    # never reuse a version number, even if the version key itself was evicted,
+    # so a payload cached under an older version can't come back to life
+    return time.time_ns()
+
+
+def _current_version(pk):
+    key = _version_key(pk)
+    version = cache.get(key)
+    if version is None:
+        cache.add(key,_new_version(),None)
+        version = cache.get(key)
+    return version
+
+
+def _count(stat):
+    key = _STATS_KEYS[stat]
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.add(key,0,None)
+        cache.incr(key)
+
+
+def get_cached_product(pk,loader):
+    """Serialized payload of product `pk`, built with `loader(pk)` on a miss.
+
+    Entries are keyed by the product's current version, so invalidate_product
+    only has to bump the version for every cached copy to stop being served.
+    """
+    key = f'store:product:{pk}:v{_current_version(pk)}'
+    payload = cache.get(key)
+    if payload is None:
+        _count('misses')
+        payload = loader(pk)
+        cache.set(key,payload,PRODUCT_CACHE_TIMEOUT)
+    else:
+        _count('hits')
+    return payload
+
+
+def invalidate_product(pk):
+    """Stop serving the cached payloads of product `pk` once the current transaction commits.
+
+    Bumping the version before the write is visible would let a concurrent read cache
+    the old row under the new version, where it would stay for PRODUCT_CACHE_TIMEOUT.
+    """
+    transaction.on_commit(lambda: cache.set(_version_key(pk),_new_version(),None))
+
+
+def product_cache_stats():
+    stats = {stat:cache.get(key,0) for stat,key in _STATS_KEYS.items()}
+    total = stats['hits'] + stats['misses']
+    stats['hit_rate'] = round(stats['hits'] / total,4) if total else None
+    return stats
@@ -0,0 +1,170 @@
+from datetime import timedelta
+from django.db import transaction
+from django.db.models import Prefetch,Sum,Value
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+from .analytics import record_order_placed
+from .cache import invalidate_product
+from .inventory import release_stock,reserve_stock
+from .models import Cart,CartLine,Product
+from .orders import create_order
+
+# how long the stock of a cart stays held after its last change
+CART_RESERVATION_TTL = timedelta(minutes=15)
+
+
+class EmptyCart(Exception):
+    pass
+
+
+class PricesChanged(Exception):
+    def __init__(self,changes):
+        self.changes = changes
+        super().__init__('Prices changed for ' + ', '.join(item['product'] for item in changes))
+
+
+def _locked_cart(user):
+    Cart.objects.get_or_create(user = user)
+    return Cart.objects.select_for_update().get(user = user)
+
+
+def _held(cart):
+    # the sweeper clears expires_at when it gives the stock back, so an expired but
+    # unswept cart still holds its stock
+    return cart.expires_at is not None
+
+
+def _apply_stock(deltas):
+    reserve_stock({product_id:delta for product_id,delta in deltas.items() if delta > 0})
+    release_stock({product_id:-delta for product_id,delta in deltas.items() if delta < 0})
+
+
+def _refresh_totals(cart,expires_at):
+    totals = cart.lines.aggregate(subtotal=Coalesce(Sum('line_total'),Value(0.0)),item_count=Coalesce(Sum('quantity'),Value(0)))
+    cart.subtotal = totals['subtotal']
+    cart.item_count = totals['item_count']
+    cart.expires_at = expires_at if totals['item_count'] else None
+    cart.save(update_fields=['subtotal','item_count','expires_at','updated_at'])
+
+
+def _reprice(cart,cart_lines):
+    # brings lines written at an older product price up to date; returns what changed
+    stale = [line for line in cart_lines if line.unit_price != line.product.price]
+    changes = []
+    for line in stale:
+        changes.append({'product':line.product.name,'old_price':line.unit_price,'price':line.product.price})
+        line.unit_price = line.product.price
+        line.line_total = line.quantity * line.product.price
+    if stale:
+        CartLine.objects.bulk_update(stale,['unit_price','line_total'])
+        _refresh_totals(cart,cart.expires_at)
+    return changes
+
+
+def get_cart(user):
+    """The user's cart with its lines and their products loaded (three queries)."""
+    Cart.objects.get_or_create(user = user)
+    return Cart.objects.prefetch_related(
+        Prefetch('lines',queryset=CartLine.objects.select_related('product').order_by('id'))
+    ).get(user = user)
+
+
+def set_line(user,product_id,quantity):
+    """Set the quantity of `product_id` in the user's cart (0 removes it) and hold the stock for it.
+
+    A cart whose hold was released by the sweeper re-reserves all of its lines.
+    Raises Product.DoesNotExist and InsufficientStock; nothing changes on failure.
+    """
+    with transaction.atomic():
+        cart = _locked_cart(user)
+        product = Product.objects.only('id','name','price').get(id = product_id)
+        lines = dict(cart.lines.values_list('product_id','quantity'))
+        if _held(cart):
+            deltas = {product_id:quantity - lines.get(product_id,0)}
+        else:
+            deltas = {**lines,product_id:quantity}
+        _apply_stock(deltas)
+        if quantity:
+            CartLine.objects.update_or_create(
+                cart = cart,product = product,
+                defaults={'quantity':quantity,'unit_price':product.price,'line_total':quantity * product.price},
+            )
+        else:
+            cart.lines.filter(product = product).delete()
+        _refresh_totals(cart,timezone.now() + CART_RESERVATION_TTL)
+    for changed in deltas:
+        invalidate_product(changed)
+    return cart
+
+
+def clear_cart(user):
+    """Empty the user's cart and give back the stock it holds."""
+    with transaction.atomic():
+        cart = _locked_cart(user)
+        if _held(cart):
+            release_stock(dict(cart.lines.values_list('product_id','quantity')))
+        released = list(cart.lines.values_list('product_id',flat=True))
+        cart.lines.all().delete()
+        _refresh_totals(cart,None)
+    for product_id in released:
+        invalidate_product(product_id)
+    return cart
+
+
+def checkout_cart(user,data):
+    """Turn the user's cart into an order priced at the cart's unit prices, then empty the cart.
+
+    The stock is already held, so only a cart released by the sweeper touches the
+    product rows again. A cart with lines priced before a product's price changed is
+    re-priced and kept instead, so the new total is seen before it is charged.
+    Raises EmptyCart, PricesChanged and InsufficientStock.
+    """
+    with transaction.atomic():
+        cart = _locked_cart(user)
+        cart_lines = list(cart.lines.select_related('product').order_by('id'))
+        if not cart_lines:
+            raise EmptyCart('The cart is empty')
+        changes = _reprice(cart,cart_lines)
+        if changes:
+            reserved = False
+        else:
+            reserved = not _held(cart)
+            if reserved:
+                reserve_stock({line.product_id:line.quantity for line in cart_lines})
+            lines = [(line.product,line.quantity,line.unit_price) for line in cart_lines]
+            order = create_order(user,data,lines)
+            cart.lines.all().delete()
+            _refresh_totals(cart,None)
+            record_order_placed(order,lines)
+    if changes:
+        raise PricesChanged(changes)
+    if reserved:
+        for line in cart_lines:
+            invalidate_product(line.product_id)
+    return order
+
+
+def release_expired_reservations(batch_size=500):
+    """Give back the stock held by carts whose reservation expired, `batch_size` carts per transaction.
+
+    The lines stay in the carts; they are reserved again on the next change or at checkout.
+    Returns the number of carts released.
+    """
+    released = 0
+    while True:
+        with transaction.atomic():
+            ids = list(
+                Cart.objects.filter(expires_at__lt = timezone.now())
+                .order_by('id').select_for_update(skip_locked=True).values_list('id',flat=True)[:batch_size]
+            )
+            if not ids:
+                return released
+            quantities = dict(
+                CartLine.objects.filter(cart_id__in = ids).values('product_id')
+                .annotate(total=Sum('quantity')).order_by().values_list('product_id','total')
+            )
+            release_stock(quantities)
+            Cart.objects.filter(id__in = ids).update(expires_at = None)
+        for product_id in quantities:
+            invalidate_product(product_id)
+        released += len(ids)
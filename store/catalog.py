@@ -0,0 +1,91 @@
+from django.db import transaction
+from django.db.models import Count,F,Q
+from .models import Product,ProductFacet
+
+
+def _truthy(value):
+    return value.lower() in ('1','true','yes')
+
+
+def filter_products(queryset,query_params):
+    """Apply the catalog filters in `query_params` to a Product queryset.
+
+    Supports category, brand (comma separated), min_price, max_price, in_stock and
+    min_rating. Raises ValueError with a readable message for malformed numbers.
+    """
+    category = query_params.get('category')
+    if category:
+        queryset = queryset.filter(category = category)
+    brand = query_params.get('brand')
+    if brand:
+        queryset = queryset.filter(brand__in = [b.strip() for b in brand.split(',') if b.strip()])
+    for param,lookup in (('min_price','price__gte'),('max_price','price__lte'),('min_rating','rating__gte')):
+        value = query_params.get(param)
+        if value not in (None,''):
+            try:
+                queryset = queryset.filter(**{lookup:float(value)})
+            except ValueError:
+                raise ValueError(f'{param} must be a number')
+    if _truthy(query_params.get('in_stock','')):
+        queryset = queryset.filter(count_in_stock__gt = 0)
+    return queryset
+
+
+def facet_counts(category=None):
+    """Category counts plus brand counts (within `category` when one is selected), from ProductFacet."""
+    rows = ProductFacet.objects.filter(
+        Q(facet = 'category',scope = '') | Q(facet = 'brand',scope = category or ''),
+        count__gt = 0,
+    ).values_list('facet','value','count')
+    facets = {'category':{},'brand':{}}
+    for facet,value,count in rows:
+        facets[facet][value] = count
+    return facets
+
+
+def _facet_keys(category,brand):
+    keys = []
+    if category:
+        keys.append(('category','',category))
+    if brand:
+        keys.append(('brand','',brand))
+        if category:
+            keys.append(('brand',category,brand))
+    return keys
+
+
+def adjust_facets(category,brand,delta):
+    """Add `delta` to every facet count a product with this category/brand contributes to."""
+    keys = _facet_keys(category,brand)
+    if not keys:
+        return
+    ProductFacet.objects.bulk_create(
+        [ProductFacet(facet = facet,scope = scope,value = value) for facet,scope,value in keys],
+        ignore_conflicts=True,
+    )
+    match = Q()
+    for facet,scope,value in keys:
+        match |= Q(facet = facet,scope = scope,value = value)
+    ProductFacet.objects.filter(match).update(count = F('count') + delta)
+
+
+def rebuild_facets():
+    """Recompute the whole facet table from products; returns the number of facet rows."""
+    products = Product.objects.order_by()
+    facets = [
+        ProductFacet(facet = 'category',scope = '',value = row['category'],count = row['count'])
+        for row in products.exclude(category = None).exclude(category = '').values('category').annotate(count=Count('id'))
+    ]
+    facets += [
+        ProductFacet(facet = 'brand',scope = '',value = row['brand'],count = row['count'])
+        for row in products.exclude(brand = None).exclude(brand = '').values('brand').annotate(count=Count('id'))
+    ]
+    facets += [
+        ProductFacet(facet = 'brand',scope = row['category'],value = row['brand'],count = row['count'])
+        for row in products.exclude(brand = None).exclude(brand = '').exclude(category = None).exclude(category = '')
+        .values('category','brand').annotate(count=Count('id'))
+    ]
+    with transaction.atomic():
+        ProductFacet.objects.all().delete()
+        ProductFacet.objects.bulk_create(facets,batch_size=1000)
+    return len(facets)
@@ -0,0 +1,39 @@
+from django.db.models import Count,Max
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
+
+
+def _etag(prefix,count,last_modified):
+    stamp = int(last_modified.timestamp() * 1_000_000) if last_modified else 0
+    return f'W/"{prefix}-{count}-{stamp}"'
+
+
+def validator_for(queryset,prefix):
+    """Cheap (etag, last_modified) pair describing the rows of `queryset`.
+
+    Built from max(updated_at) and the row count, so nothing gets serialized;
+    the count catches deletions that leave max(updated_at) unchanged.
+    """
+    stats = queryset.order_by().aggregate(last_modified=Max('updated_at'),count=Count('id'))
+    return _etag(prefix,stats['count'],stats['last_modified']),stats['last_modified']
+
+
+def object_validator(prefix,updated_at):
+    return _etag(prefix,1,updated_at),updated_at
+
+
+def not_modified(request,etag,last_modified):
+    """The 304 response to send back if the client's copy is still current, else None."""
+    return get_conditional_response(
+        request,
+        etag=etag,
+        last_modified=int(last_modified.timestamp()) if last_modified else None,
+    )
+
+
+def with_validators(response,etag,last_modified):
+    response['ETag'] = etag
+    if last_modified:
+        response['Last-Modified'] = http_date(last_modified.timestamp())
+    return response
+
@@ -0,0 +1,121 @@
+import asyncio
+import json
+import logging
+import select
+import threading
+import time
+from collections import defaultdict
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connections,transaction
+
+logger = logging.getLogger(__name__)
+
+ORDER_EVENTS_CHANNEL = 'order_events'
+# a client that stops reading loses events past this many instead of growing the worker's memory
+SUBSCRIBER_QUEUE_SIZE = 100
+LISTEN_POLL_SECONDS = 5
+LISTEN_RETRY_SECONDS = 2
+
+
+def _order_event(order):
+    return {
+        'order':order.id,
+        'user':order.user_id,
+        'is_paid':order.is_paid,
+        'paid_at':order.paid_at,
+        'is_delivered':order.is_delivered,
+        'delivered_at':order.delivered_at,
+    }
+
+
+def _offer(queue,event):
+    try:
+        queue.put_nowait(event)
+    except asyncio.QueueFull:
+        pass
+
+
+class OrderEventHub:
+    """Fans order events out to the SSE streams open in this worker.
+
+    On PostgreSQL a single daemon thread per worker LISTENs on ORDER_EVENTS_CHANNEL,
+    so every worker sees the events published by any other one. On other databases
+    events are only delivered within the publishing process.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._subscribers = defaultdict(set)
+        self._listener = None
+
+    def subscribe(self,user_id):
+        """Queue of the events for `user_id`, fed on the running event loop."""
+        queue = asyncio.Queue(maxsize=SUBSCRIBER_QUEUE_SIZE)
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            self._subscribers[user_id].add((loop,queue))
+            if connections['default'].vendor == 'postgresql' and self._listener is None:
+                self._listener = threading.Thread(target=self._listen,name='order-events-listener',daemon=True)
+                self._listener.start()
+        return queue
+
+    def unsubscribe(self,user_id,queue):
+        with self._lock:
+            subscribers = self._subscribers.get(user_id,set())
+            subscribers.difference_update({entry for entry in subscribers if entry[1] is queue})
+            if not subscribers:
+                self._subscribers.pop(user_id,None)
+
+    def dispatch(self,payload):
+        event = json.loads(payload)
+        with self._lock:
+            targets = list(self._subscribers.get(event['user'],()))
+        for loop,queue in targets:
+            loop.call_soon_threadsafe(_offer,queue,event)
+
+    def _listen(self):
+        database = connections['default']
+        while True:
+            conn = None
+            try:
+                conn = database.get_new_connection(database.get_connection_params())
+                conn.autocommit = True
+                with conn.cursor() as cursor:
+                    cursor.execute(f'LISTEN {ORDER_EVENTS_CHANNEL}')
+                while True:
+                    if select.select([conn],[],[],LISTEN_POLL_SECONDS) == ([],[],[]):
+                        continue
+                    conn.poll()
+                    while conn.notifies:
+                        self.dispatch(conn.notifies.pop(0).payload)
+            except Exception:
+                logger.exception('order events listener lost its connection, reconnecting')
+                time.sleep(LISTEN_RETRY_SECONDS)
+            finally:
+                if conn is not None:
+                    conn.close()
+
+
+order_events = OrderEventHub()
+
+
+def publish_order_event(order):
+    """Tell the owner's open streams about the new state of `order` once the current transaction commits."""
+    publish_order_events([_order_event(order)])
+
+
+def publish_order_events(events):
+    """Publish several order events (dicts shaped like _order_event) with a single statement."""
+    payloads = [json.dumps(event,cls=DjangoJSONEncoder) for event in events]
+    if not payloads:
+        return
+    connection = connections['default']
+    if connection.vendor == 'postgresql':
+        # NOTIFY is transactional: listeners only get it if the update commits
+        with connection.cursor() as cursor:
+            cursor.execute(
+                'SELECT pg_notify(%s, payload) FROM unnest(%s::text[]) AS payload',
+                [ORDER_EVENTS_CHANNEL,payloads],
+            )
+    else:
+        transaction.on_commit(lambda: [order_events.dispatch(payload) for payload in payloads])
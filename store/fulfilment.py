@@ -0,0 +1,66 @@
+from django.db import transaction
+from django.utils import timezone
+from .analytics import record_orders_paid
+from .events import publish_order_events
+from .models import Order,OrderTransitionAudit
+from .orders import filter_orders,ORDER_FILTERS
+
+BULK_TRANSITION_LIMIT = 1000
+# action -> (flag set by the transition, timestamp field stamped with it)
+TRANSITIONS = {
+    'paid':('is_paid','paid_at'),
+    'delivered':('is_delivered','delivered_at'),
+}
+
+
+def bulk_transition(action,user,ids=None,filters=None):
+    """Mark the orders in `ids` (or those matching the order `filters`) paid or delivered.
+
+    The matching orders are locked, then every one still pending is flipped by a single
+    UPDATE guarded on the flag, and the request is recorded as one OrderTransitionAudit.
+    Returns ({order id: 'updated' | 'already_<action>' | 'not_found'}, audit). A filter
+    selects at most BULK_TRANSITION_LIMIT orders, oldest ids first; it must set at least one
+    of ORDER_FILTERS and nothing else, or ValueError is raised.
+    """
+    if ids is None:
+        unknown = sorted(set(filters) - set(ORDER_FILTERS))
+        if unknown:
+            raise ValueError(f'unknown filter {", ".join(unknown)}; use {", ".join(ORDER_FILTERS)}')
+        # filter_orders skips blank values, so a filter without one would select every order
+        if not any(filters.values()):
+            raise ValueError(f'filter needs at least one of {", ".join(ORDER_FILTERS)}')
+    flag,stamp_field = TRANSITIONS[action]
+    now = timezone.now()
+    stamp = now if action == 'paid' else timezone.localdate(now)
+    with transaction.atomic():
+        orders = Order.objects.select_for_update().order_by('id')
+        if ids is not None:
+            orders = orders.filter(id__in = ids)
+        else:
+            orders = filter_orders(orders,filters)[:BULK_TRANSITION_LIMIT]
+        rows = list(orders.values('id','user_id','is_paid','paid_at','is_delivered','delivered_at'))
+        pending = [row for row in rows if not row[flag]]
+        pending_ids = [row['id'] for row in pending]
+        updated = set(pending_ids)
+        if pending_ids:
+            Order.objects.filter(id__in = pending_ids,**{flag:False}).update(
+                **{flag:True,stamp_field:stamp,'updated_at':now}
+            )
+            if action == 'paid':
+                record_orders_paid(pending_ids,timezone.localdate(now))
+            events = []
+            for row in pending:
+                row.update({flag:True,stamp_field:stamp})
+                events.append({
+                    'order':row['id'],'user':row['user_id'],
+                    'is_paid':row['is_paid'],'paid_at':row['paid_at'],
+                    'is_delivered':row['is_delivered'],'delivered_at':row['delivered_at'],
+                })
+            publish_order_events(events)
+        audit = OrderTransitionAudit.objects.create(
+            action = action,user = user,requested = len(ids) if ids is not None else len(rows),order_ids = pending_ids,
+        )
+    results = {order_id:'not_found' for order_id in (ids or [])}
+    for row in rows:
+        results[row['id']] = 'updated' if row['id'] in updated else f'already_{action}'
+    return results,audit
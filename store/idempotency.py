@@ -0,0 +1,74 @@
+import hashlib
+import json
+from datetime import timedelta
+from functools import wraps
+from django.db import transaction
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.response import Response
+from .models import IdempotencyKey
+
+
+IDEMPOTENCY_HEADER = 'Idempotency-Key'
+IDEMPOTENCY_KEY_TTL = timedelta(hours=24)
+
+
+def _request_hash(request):
+    body = json.dumps(request.data,sort_keys=True,default=str)
+    return hashlib.sha256(body.encode()).hexdigest()
+
+
+def idempotent(view):
+    """Make a POST view safe to retry when the client sends an Idempotency-Key header.
+
+    The key row is created (or locked) in the same transaction the view runs in.
+    A concurrent duplicate therefore blocks on the key's unique index until the
+    first request commits, then gets the stored response instead of re-running
+    the view. Only successful responses are stored; a failed attempt can be retried.
+    """
+    @wraps(view)
+    def wrapper(request,*args,**kwargs):
+        key = request.headers.get(IDEMPOTENCY_HEADER)
+        if not key:
+            return view(request,*args,**kwargs)
+        if len(key) > 255:
+            return Response({'detail':f'{IDEMPOTENCY_HEADER} must be at most 255 characters'},status=status.HTTP_400_BAD_REQUEST)
+        request_hash = _request_hash(request)
+        now = timezone.now()
+        with transaction.atomic():
+            record,created = IdempotencyKey.objects.select_for_update().get_or_create(
+                user = request.user,
+                key = key,
+                defaults={'request_hash':request_hash,'expires_at':now + IDEMPOTENCY_KEY_TTL},
+            )
+            if not created and record.expires_at > now:
+                if record.request_hash != request_hash:
+                    return Response({'detail':f'{IDEMPOTENCY_HEADER} was already used with a different request'},
+                                    status=status.HTTP_422_UNPROCESSABLE_ENTITY)
+                response = Response(record.response_body,status=record.response_status)
+                response['Idempotent-Replayed'] = 'true'
+                return response
+            response = view(request,*args,**kwargs)
+            if status.is_success(response.status_code):
+                record.request_hash = request_hash
+                record.response_status = response.status_code
+                record.response_body = response.data
+                record.expires_at = now + IDEMPOTENCY_KEY_TTL
+                record.save()
+            else:
+                record.delete()
+            return response
+    return wrapper
+
+
+def sweep_expired_keys(batch_size=1000):
+    """Delete expired keys in batches of `batch_size`; returns how many were removed."""
+    removed = 0
+    while True:
+        ids = list(
+            IdempotencyKey.objects.filter(expires_at__lt = timezone.now())
+            .values_list('id',flat=True)[:batch_size]
+        )
+        if not ids:
+            return removed
+        removed += IdempotencyKey.objects.filter(id__in = ids).delete()[0]
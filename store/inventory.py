@@ -0,0 +1,62 @@
+from django.db.models import Case,F,IntegerField,Value,When
+from django.utils import timezone
+from .models import Product
+
+
+class InsufficientStock(Exception):
+    def __init__(self,shortages):
+        self.shortages = shortages
+        super().__init__('Insufficient stock for ' + ', '.join(item['product'] for item in shortages))
+
+
+def reserve_stock(quantities):
+    """Take `quantities` ({product_id: qty}) out of stock, all or nothing.
+
+    Must run inside transaction.atomic. The product rows are locked with
+    SELECT ... FOR UPDATE in id order, so concurrent checkouts touching the same
+    products queue up instead of deadlocking, and checkouts for other products
+    don't wait at all. Raises InsufficientStock listing every short line, and
+    ValueError for a quantity below 1, which would put stock back instead.
+    """
+    invalid = [product_id for product_id,quantity in quantities.items() if quantity < 1]
+    if invalid:
+        raise ValueError(f'Quantities to reserve must be at least 1, not for products {invalid}')
+    locked = (
+        Product.objects.select_for_update()
+        .filter(id__in = quantities)
+        .order_by('id')
+        .values_list('id','name','count_in_stock')
+    )
+    shortages = [
+        {'product':name,'requested':quantities[product_id],'available':count_in_stock}
+        for product_id,name,count_in_stock in locked
+        if count_in_stock < quantities[product_id]
+    ]
+    if shortages:
+        raise InsufficientStock(shortages)
+    adjust_stock({product_id:-quantity for product_id,quantity in quantities.items()})
+
+
+def adjust_stock(deltas):
+    """Apply {product_id: delta} to count_in_stock in a single UPDATE."""
+    if not deltas:
+        return
+    Product.objects.filter(id__in = deltas).update(
+        count_in_stock = F('count_in_stock') + Case(
+            *[When(id = product_id,then=Value(delta)) for product_id,delta in deltas.items()],
+            output_field=IntegerField(),
+        ),
+        updated_at = timezone.now(),
+    )
+
+
+def release_stock(quantities):
+    """Put `quantities` ({product_id: qty}) back in stock.
+
+    Locks the rows in id order first, like reserve_stock, so a release can't deadlock
+    against a concurrent reservation. Must run inside transaction.atomic.
+    """
+    if not quantities:
+        return
+    list(Product.objects.select_for_update().filter(id__in = quantities).order_by('id').values_list('id',flat=True))
+    adjust_stock(quantities)
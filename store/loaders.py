@@ -0,0 +1,45 @@
+from django.shortcuts import get_object_or_404
+from rest_framework.permissions import BasePermission
+
+
+def load_object(request,queryset,pk):
+    """`queryset.get(pk=pk)`, fetched once per request and shared by the permission classes and the view.
+
+    Raises Http404 when the object doesn't exist, which DRF turns into a 404 response.
+    """
+    loaded = getattr(request,'_loaded_objects',None)
+    if loaded is None:
+        loaded = request._loaded_objects = {}
+    key = (queryset.model,str(pk))
+    if key not in loaded:
+        loaded[key] = get_object_or_404(queryset,pk=pk)
+    return loaded[key]
+
+
+def load_owned(request,queryset,pk):
+    """load_object followed by the view's object permissions, for views whose OwnerPermission
+    leaves the load to them; a 403 (or 401) is raised like the permission check would.
+    """
+    obj = load_object(request,queryset,pk)
+    request.parser_context['view'].check_object_permissions(request,obj)
+    return obj
+
+
+class OwnerPermission(BasePermission):
+    """Allows the request when request.user owns the object named by the view's `pk`.
+
+    The object is loaded through load_object, so the view gets the same instance back
+    without another query; subclasses set `queryset` to what the view needs loaded.
+    Subclasses for views that lock the object leave `queryset` unset instead: the view
+    loads it inside its transaction with load_owned, so one locked query serves both.
+    """
+    queryset = None
+
+    def has_permission(self,request,view):
+        if self.queryset is None:
+            return request.user.is_authenticated
+        obj = load_object(request,self.queryset.all(),view.kwargs['pk'])
+        return self.has_object_permission(request,view,obj)
+
+    def has_object_permission(self,request,view,obj):
+        return request.user.is_authenticated and obj.user_id == request.user.id
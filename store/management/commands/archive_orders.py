@@ -0,0 +1,17 @@
+from datetime import timedelta
+from django.core.management.base import BaseCommand
+from store.archive import ARCHIVE_AFTER,archive_delivered_orders
+
+
+class Command(BaseCommand):
+    help = "Move delivered orders older than --older-than-days into the order archive tables (run periodically)"
+
+    def add_arguments(self,parser):
+        parser.add_argument('--older-than-days',type=int,default=ARCHIVE_AFTER.days,
+                            help=f'Archive delivered orders created more than this many days ago (default {ARCHIVE_AFTER.days})')
+        parser.add_argument('--batch-size',type=int,default=500,
+                            help='Number of orders moved per transaction (default 500)')
+
+    def handle(self,*args,**options):
+        archived = archive_delivered_orders(timedelta(days=options['older_than_days']),options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'Archived {archived} orders'))
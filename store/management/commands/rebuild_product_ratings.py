@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Max,Min
+from store.models import Product
+from store.ratings import rebuild_product_ratings
+
+
+class Command(BaseCommand):
+    help = "Recompute every product's rating, num_reviews and rating_sum from its reviews and fix the ones that drifted"
+
+    def add_arguments(self,parser):
+        parser.add_argument('--batch-size',type=int,default=1000,
+                            help='Number of product ids updated per statement (default 1000)')
+
+    def handle(self,*args,**options):
+        batch_size = options['batch_size']
+        bounds = Product.objects.aggregate(first=Min('id'),last=Max('id'))
+        if bounds['first'] is None:
+            self.stdout.write('No products to rebuild')
+            return
+        updated = 0
+        for start in range(bounds['first'],bounds['last'] + 1,batch_size):
+            with transaction.atomic():
+                updated += rebuild_product_ratings(start,start + batch_size)
+        self.stdout.write(self.style.SUCCESS(f'Fixed the ratings of {updated} products'))
@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand,CommandError
+from django.utils.dateparse import parse_date
+from store.analytics import rebuild_rollups
+
+
+class Command(BaseCommand):
+    help = "Recompute the daily sales rollups from the live and archived orders (all days, or only from --since on)"
+
+    def add_arguments(self,parser):
+        parser.add_argument('--since',help='First day to rebuild (YYYY-MM-DD); earlier days are left untouched')
+
+    def handle(self,*args,**options):
+        since = None
+        if options['since']:
+            since = parse_date(options['since'])
+            if since is None:
+                raise CommandError('--since must be a date (YYYY-MM-DD)')
+        days = rebuild_rollups(since)
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt sales rollups for {days} days'))
@@ -0,0 +1,10 @@
+from django.core.management.base import BaseCommand
+from store.catalog import rebuild_facets
+
+
+class Command(BaseCommand):
+    help = "Recompute the precomputed catalog facet counts (run periodically to correct any drift)"
+
+    def handle(self,*args,**options):
+        rows = rebuild_facets()
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt {rows} facet counts'))
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+from store.carts import release_expired_reservations
+
+
+class Command(BaseCommand):
+    help = "Give back the stock held by carts whose reservation expired (run every few minutes)"
+
+    def add_arguments(self,parser):
+        parser.add_argument('--batch-size',type=int,default=500,
+                            help='Number of carts released per transaction (default 500)')
+
+    def handle(self,*args,**options):
+        released = release_expired_reservations(options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'Released the reservations of {released} carts'))
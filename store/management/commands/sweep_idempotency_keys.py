@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+from store.idempotency import sweep_expired_keys
+
+
+class Command(BaseCommand):
+    help = "Delete expired Idempotency-Key records (run periodically)"
+
+    def add_arguments(self,parser):
+        parser.add_argument('--batch-size',type=int,default=1000,
+                            help='Number of keys deleted per statement (default 1000)')
+
+    def handle(self,*args,**options):
+        removed = sweep_expired_keys(options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'Removed {removed} expired idempotency keys'))
@@ -0,0 +1,33 @@
+# Generated by Django 5.1 on 2026-10-18 20:33
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("store", "0016_product_updated_at_order_updated_at"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="product",
+            name="rating_sum",
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=12),
+        ),
+        migrations.RunSQL(
+            sql="""
+                UPDATE products
+                SET rating_sum = totals.rating_sum,
+                    num_reviews = totals.num_reviews,
+                    rating = totals.rating_sum / totals.num_reviews
+                FROM (
+                    SELECT product_id, SUM(rating) AS rating_sum, COUNT(*) AS num_reviews
+                    FROM store_review
+                    GROUP BY product_id
+                ) AS totals
+                WHERE totals.product_id = products.id
+            """,
+            reverse_sql=migrations.RunSQL.noop,
+        ),
+    ]
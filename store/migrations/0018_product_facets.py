@@ -0,0 +1,79 @@
+# Generated by Django 5.1 on 2026-10-18 20:35
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("store", "0017_product_rating_sum"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ProductFacet",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "facet",
+                    models.CharField(
+                        choices=[("category", "category"), ("brand", "brand")],
+                        max_length=20,
+                    ),
+                ),
+                ("scope", models.CharField(blank=True, default="", max_length=100)),
+                ("value", models.CharField(max_length=100)),
+                ("count", models.IntegerField(default=0)),
+            ],
+            options={
+                "db_table": "product_facets",
+            },
+        ),
+        migrations.AddIndex(
+            model_name="product",
+            index=models.Index(
+                fields=["category", "brand", "price"],
+                name="product_cat_brand_price_idx",
+            ),
+        ),
+        migrations.AddConstraint(
+            model_name="productfacet",
+            constraint=models.UniqueConstraint(
+                fields=("facet", "scope", "value"), name="unique_product_facet"
+            ),
+        ),
+        migrations.RunSQL(
+            sql=[
+                """
+                INSERT INTO product_facets (facet, scope, value, count)
+                SELECT 'category', '', category, COUNT(*) FROM products
+                WHERE category IS NOT NULL AND category <> ''
+                GROUP BY category
+                """,
+                """
+                INSERT INTO product_facets (facet, scope, value, count)
+                SELECT 'brand', '', brand, COUNT(*) FROM products
+                WHERE brand IS NOT NULL AND brand <> ''
+                GROUP BY brand
+                """,
+                """
+                INSERT INTO product_facets (facet, scope, value, count)
+                SELECT 'brand', category, brand, COUNT(*) FROM products
+                WHERE brand IS NOT NULL AND brand <> ''
+                AND category IS NOT NULL AND category <> ''
+                GROUP BY category, brand
+                """,
+            ],
+            reverse_sql=migrations.RunSQL.noop,
+        ),
+    ]
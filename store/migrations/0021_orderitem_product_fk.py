@@ -0,0 +1,79 @@
+# Generated by Django 5.1 on 2026-10-18 20:45
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+BATCH_SIZE = 2000
+
+
+def copy_order_products(apps, schema_editor):
+    # walk Order_Products by id in fixed-size batches so large tables are never loaded at once
+    Order_Products = apps.get_model("store", "Order_Products")
+    OrderItem = apps.get_model("store", "OrderItem")
+    last_id = 0
+    while True:
+        rows = list(
+            Order_Products.objects.filter(id__gt=last_id)
+            .order_by("id")
+            .values("id", "orderitem_id", "product_id", "product__name")[:BATCH_SIZE]
+        )
+        if not rows:
+            break
+        OrderItem.objects.bulk_update(
+            [
+                OrderItem(
+                    id=row["orderitem_id"],
+                    product_ref_id=row["product_id"],
+                    product_name=row["product__name"] or "",
+                )
+                for row in rows
+            ],
+            ["product_ref", "product_name"],
+        )
+        last_id = rows[-1]["id"]
+
+
+def restore_order_products(apps, schema_editor):
+    Order_Products = apps.get_model("store", "Order_Products")
+    OrderItem = apps.get_model("store", "OrderItem")
+    last_id = 0
+    while True:
+        rows = list(
+            OrderItem.objects.filter(id__gt=last_id, product_ref__isnull=False)
+            .order_by("id")
+            .values("id", "product_ref_id")[:BATCH_SIZE]
+        )
+        if not rows:
+            break
+        Order_Products.objects.bulk_create(
+            [
+                Order_Products(orderitem_id=row["id"], product_id=row["product_ref_id"])
+                for row in rows
+            ]
+        )
+        last_id = rows[-1]["id"]
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("store", "0020_order_created_at"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="orderitem",
+            name="product_ref",
+            field=models.ForeignKey(
+                null=True,
+                on_delete=django.db.models.deletion.SET_NULL,
+                related_name="+",
+                to="store.product",
+            ),
+        ),
+        migrations.AddField(
+            model_name="orderitem",
+            name="product_name",
+            field=models.CharField(blank=True, default="", max_length=100),
+        ),
+        migrations.RunPython(copy_order_products, restore_order_products),
+    ]
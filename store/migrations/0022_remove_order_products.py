@@ -0,0 +1,34 @@
+# Generated by Django 5.1 on 2026-10-18 20:45
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("store", "0021_orderitem_product_fk"),
+    ]
+
+    operations = [
+        migrations.RemoveField(
+            model_name="orderitem",
+            name="product",
+        ),
+        migrations.DeleteModel(
+            name="Order_Products",
+        ),
+        migrations.RenameField(
+            model_name="orderitem",
+            old_name="product_ref",
+            new_name="product",
+        ),
+        migrations.AlterField(
+            model_name="orderitem",
+            name="product",
+            field=models.ForeignKey(
+                null=True,
+                on_delete=django.db.models.deletion.SET_NULL,
+                to="store.product",
+            ),
+        ),
+    ]
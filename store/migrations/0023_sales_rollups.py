@@ -0,0 +1,102 @@
+# Generated by Django 5.1 on 2026-10-18 20:39
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("store", "0022_remove_order_products"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="DailySales",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("day", models.DateField(unique=True)),
+                ("orders", models.IntegerField(default=0)),
+                ("units", models.IntegerField(default=0)),
+                ("revenue", models.FloatField(default=0)),
+                ("paid_orders", models.IntegerField(default=0)),
+                ("paid_revenue", models.FloatField(default=0)),
+            ],
+            options={
+                "db_table": "analytics_daily_sales",
+            },
+        ),
+        migrations.CreateModel(
+            name="DailyCategorySales",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("day", models.DateField()),
+                ("category", models.CharField(blank=True, default="", max_length=100)),
+                ("orders", models.IntegerField(default=0)),
+                ("units", models.IntegerField(default=0)),
+                ("revenue", models.FloatField(default=0)),
+            ],
+            options={
+                "db_table": "analytics_daily_category_sales",
+                "constraints": [
+                    models.UniqueConstraint(
+                        fields=("day", "category"), name="unique_daily_category_sales"
+                    )
+                ],
+            },
+        ),
+        migrations.CreateModel(
+            name="DailyProductSales",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("day", models.DateField()),
+                (
+                    "product_name",
+                    models.CharField(blank=True, default="", max_length=100),
+                ),
+                ("orders", models.IntegerField(default=0)),
+                ("units", models.IntegerField(default=0)),
+                ("revenue", models.FloatField(default=0)),
+                (
+                    "product",
+                    models.ForeignKey(
+                        null=True,
+                        on_delete=django.db.models.deletion.SET_NULL,
+                        to="store.product",
+                    ),
+                ),
+            ],
+            options={
+                "db_table": "analytics_daily_product_sales",
+                "constraints": [
+                    models.UniqueConstraint(
+                        fields=("day", "product"), name="unique_daily_product_sales"
+                    )
+                ],
+            },
+        ),
+    ]
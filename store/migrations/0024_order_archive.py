@@ -0,0 +1,102 @@
+# Generated by Django 5.1 on 2026-10-18 20:42
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("store", "0023_sales_rollups"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ArchivedOrder",
+            fields=[
+                ("id", models.BigIntegerField(primary_key=True, serialize=False)),
+                (
+                    "payment_method",
+                    models.CharField(
+                        choices=[
+                            ("visa", "visa"),
+                            ("cash", "cash"),
+                            ("fawry", "fawry"),
+                        ],
+                        default="visa",
+                        max_length=100,
+                    ),
+                ),
+                ("is_paid", models.BooleanField(default=False)),
+                ("is_delivered", models.BooleanField(default=True)),
+                ("paid_at", models.DateTimeField(null=True)),
+                ("delivered_at", models.DateField(null=True)),
+                ("price", models.FloatField(default=0)),
+                ("shipping_price", models.FloatField(default=50)),
+                ("total_price", models.FloatField(default=0)),
+                ("tax_price", models.FloatField(default=0)),
+                ("created_at", models.DateTimeField()),
+                ("updated_at", models.DateTimeField()),
+                ("country", models.CharField(blank=True, default="", max_length=100)),
+                ("city", models.CharField(blank=True, default="", max_length=100)),
+                ("postal_code", models.IntegerField(null=True)),
+                (
+                    "archived_at",
+                    models.DateTimeField(default=django.utils.timezone.now),
+                ),
+                (
+                    "user",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="archived_orders",
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+            ],
+            options={
+                "db_table": "store_order_archive",
+            },
+        ),
+        migrations.CreateModel(
+            name="ArchivedOrderItem",
+            fields=[
+                ("id", models.BigIntegerField(primary_key=True, serialize=False)),
+                (
+                    "product_name",
+                    models.CharField(blank=True, default="", max_length=100),
+                ),
+                ("quantity", models.IntegerField(default=0)),
+                ("price", models.FloatField(default=0)),
+                (
+                    "order",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="items",
+                        to="store.archivedorder",
+                    ),
+                ),
+                (
+                    "product",
+                    models.ForeignKey(
+                        null=True,
+                        on_delete=django.db.models.deletion.SET_NULL,
+                        related_name="+",
+                        to="store.product",
+                    ),
+                ),
+            ],
+            options={
+                "db_table": "store_orderitem_archive",
+            },
+        ),
+        migrations.AddIndex(
+            model_name="archivedorder",
+            index=models.Index(
+                fields=["user", "-created_at", "-id"],
+                name="order_archive_user_created_idx",
+            ),
+        ),
+    ]
@@ -0,0 +1,59 @@
+# Generated by Django 5.1 on 2026-10-18 21:04
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("store", "0026_cart"),
+    ]
+
+    operations = [
+        migrations.RemoveConstraint(
+            model_name="dailycategorysales",
+            name="unique_daily_category_sales",
+        ),
+        migrations.RemoveConstraint(
+            model_name="dailyproductsales",
+            name="unique_daily_product_sales",
+        ),
+        migrations.AddField(
+            model_name="dailycategorysales",
+            name="shard",
+            field=models.SmallIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name="dailyproductsales",
+            name="shard",
+            field=models.SmallIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name="dailysales",
+            name="shard",
+            field=models.SmallIntegerField(default=0),
+        ),
+        migrations.AlterField(
+            model_name="dailysales",
+            name="day",
+            field=models.DateField(),
+        ),
+        migrations.AddConstraint(
+            model_name="dailycategorysales",
+            constraint=models.UniqueConstraint(
+                fields=("day", "category", "shard"), name="unique_daily_category_sales"
+            ),
+        ),
+        migrations.AddConstraint(
+            model_name="dailyproductsales",
+            constraint=models.UniqueConstraint(
+                fields=("day", "product", "shard"), name="unique_daily_product_sales"
+            ),
+        ),
+        migrations.AddConstraint(
+            model_name="dailysales",
+            constraint=models.UniqueConstraint(
+                fields=("day", "shard"), name="unique_daily_sales"
+            ),
+        ),
+    ]
@@ -2,6 +2,8 @@ from django.db import models
 from django.utils import timezone
 from django.contrib.auth.models import User
 from django.core.validators import MinLengthValidator,MinValueValidator
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchVector,SearchVectorField
 # Create your models here.
 
 
@@ -15,9 +17,22 @@ class Product(models.Model):
     description = models.TextField(null=True,blank= True)
     rating = models.DecimalField(max_digits=10,decimal_places=2,default=0)
     num_reviews = models.IntegerField(default=0,validators=[MinValueValidator(0)])
+    # running total of review ratings, kept next to num_reviews so rating = rating_sum / num_reviews
+    rating_sum = models.DecimalField(max_digits=12,decimal_places=2,default=0)
     price = models.FloatField(default=0,validators=[MinValueValidator(0)])
     count_in_stock = models.IntegerField(null=False,default = 0,validators = [MinValueValidator(0)])
     created_at = models.DateTimeField(default=timezone.now)
+    updated_at = models.DateTimeField(auto_now=True)
+    # weighted full-text document kept up to date by postgres itself
+    search_vector = models.GeneratedField(
+        expression=(
+            SearchVector('name',weight='A',config='english')
+            + SearchVector('brand','category',weight='B',config='english')
+            + SearchVector('description',weight='C',config='english')
+        ),
+        output_field=SearchVectorField(),
+        db_persist=True,
+    )
 
     def __str__(self):
         return self.name
@@ -31,6 +46,32 @@ class Product(models.Model):
             models.CheckConstraint(check=models.Q(num_reviews__gte=0),name='non_negative_num_review'),
             models.CheckConstraint(check=models.Q(count_in_stock__gte=0),name='non_negative_count_in_stock')   
         ]
+        indexes = [
+            models.Index(fields=['created_at','id'],name='product_created_at_id_idx'),
+            GinIndex(fields=['search_vector'],name='product_search_vector_idx'),
+            GinIndex(fields=['name'],name='product_name_trgm_idx',opclasses=['gin_trgm_ops']),
+            GinIndex(fields=['brand'],name='product_brand_trgm_idx',opclasses=['gin_trgm_ops']),
+            models.Index(fields=['category','brand','price'],name='product_cat_brand_price_idx'),
+        ]
+
+
+class ProductFacet(models.Model):
+    # precomputed facet counts for catalog browsing; brand counts are stored both
+    # catalog-wide (scope='') and per category (scope=<category>)
+    facet_choices = [
+        ('category','category'),
+        ('brand','brand'),
+    ]
+    facet = models.CharField(max_length=20,choices=facet_choices)
+    scope = models.CharField(max_length=100,blank=True,default='')
+    value = models.CharField(max_length=100)
+    count = models.IntegerField(default=0)
+
+    class Meta:
+        db_table = "product_facets"
+        constraints = [
+            models.UniqueConstraint(fields=['facet','scope','value'],name='unique_product_facet'),
+        ]
 
 
 class Review(models.Model):
@@ -57,20 +98,25 @@ class Order(models.Model):
     shipping_price = models.FloatField(default=50)
     total_price = models.FloatField(default=0)
     tax_price = models.FloatField(default = 0)
+    created_at = models.DateTimeField(default=timezone.now)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['user','-created_at','-id'],name='order_user_created_idx'),
+            models.Index(fields=['is_paid','is_delivered','-created_at'],name='order_status_created_idx'),
+            models.Index(fields=['-created_at','-id'],name='order_created_idx'),
+        ]
 
 class OrderItem(models.Model):
-    product = models.ManyToManyField(Product, through='Order_Products')
+    product = models.ForeignKey(Product, on_delete=models.SET_NULL, null=True)
+    # snapshot of the product as it was ordered; price is the unit price
+    product_name = models.CharField(max_length=100, blank=True, default='')
     order = models.ForeignKey(Order, on_delete=models.CASCADE)
     quantity = models.IntegerField(default=0, validators=[MinValueValidator(1)])
     price = models.FloatField(default=0)
 
 
-
-class Order_Products(models.Model):
-    product = models.ForeignKey(Product,on_delete=models.SET_NULL,null=True)
-    orderitem = models.ForeignKey(OrderItem,on_delete=models.CASCADE)
-
-
 class ShippingAddress(models.Model):
     order = models.OneToOneField(Order,on_delete=models.CASCADE,related_name='order_shipping')
     country = models.CharField(max_length=100)
@@ -78,3 +124,153 @@ class ShippingAddress(models.Model):
     postal_code = models.IntegerField()
 
 
+
+
+class Cart(models.Model):
+    # server-side basket; while expires_at is set the stock of its lines is held out of count_in_stock.
+    # subtotal and item_count cache the sums of the lines
+    user = models.OneToOneField(User,on_delete=models.CASCADE,related_name='cart')
+    subtotal = models.FloatField(default=0)
+    item_count = models.IntegerField(default=0)
+    expires_at = models.DateTimeField(null=True,db_index=True)
+    created_at = models.DateTimeField(default=timezone.now)
+    updated_at = models.DateTimeField(auto_now=True)
+
+
+class CartLine(models.Model):
+    cart = models.ForeignKey(Cart,on_delete=models.CASCADE,related_name='lines')
+    product = models.ForeignKey(Product,on_delete=models.CASCADE,related_name='+')
+    quantity = models.IntegerField(default=1,validators=[MinValueValidator(1)])
+    # product price when the line was last written; line_total = quantity * unit_price
+    unit_price = models.FloatField(default=0)
+    line_total = models.FloatField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['cart','product'],name='unique_cart_product'),
+        ]
+
+
+
+class IdempotencyKey(models.Model):
+    # stored response of a request made with an Idempotency-Key header, replayed on retries until expires_at
+    user = models.ForeignKey(User,on_delete=models.CASCADE)
+    key = models.CharField(max_length=255)
+    request_hash = models.CharField(max_length=64)
+    response_status = models.PositiveSmallIntegerField(null=True)
+    response_body = models.JSONField(null=True)
+    expires_at = models.DateTimeField(db_index=True)
+
+    class Meta:
+        db_table = "idempotency_keys"
+        constraints = [
+            models.UniqueConstraint(fields=['user','key'],name='unique_idempotency_key'),
+        ]
+
+
+
+
+class OrderTransitionAudit(models.Model):
+    # one row per bulk paid/delivered request, listing the orders it actually changed
+    action_choices = [
+        ('paid','paid'),
+        ('delivered','delivered'),
+    ]
+    action = models.CharField(max_length=20,choices=action_choices)
+    user = models.ForeignKey(User,on_delete=models.SET_NULL,null=True)
+    requested = models.IntegerField(default=0)
+    order_ids = models.JSONField(default=list)
+    created_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        db_table = "order_transition_audits"
+
+
+class ArchivedOrder(models.Model):
+    # delivered orders moved out of store_order by the archive_orders command; id is the original order id
+    # and the shipping address is folded in
+    id = models.BigIntegerField(primary_key=True)
+    user = models.ForeignKey(User,on_delete=models.CASCADE,related_name='archived_orders')
+    payment_method = models.CharField(max_length=100,default='visa',choices=Order.payment_methods_choices)
+    is_paid = models.BooleanField(default=False)
+    is_delivered = models.BooleanField(default=True)
+    paid_at = models.DateTimeField(null=True)
+    delivered_at = models.DateField(null=True)
+    price = models.FloatField(default=0)
+    shipping_price = models.FloatField(default=50)
+    total_price = models.FloatField(default=0)
+    tax_price = models.FloatField(default=0)
+    created_at = models.DateTimeField()
+    updated_at = models.DateTimeField()
+    country = models.CharField(max_length=100,blank=True,default='')
+    city = models.CharField(max_length=100,blank=True,default='')
+    postal_code = models.IntegerField(null=True)
+    archived_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        db_table = "store_order_archive"
+        indexes = [
+            models.Index(fields=['user','-created_at','-id'],name='order_archive_user_created_idx'),
+        ]
+
+
+class ArchivedOrderItem(models.Model):
+    id = models.BigIntegerField(primary_key=True)
+    order = models.ForeignKey(ArchivedOrder,on_delete=models.CASCADE,related_name='items')
+    product = models.ForeignKey(Product,on_delete=models.SET_NULL,null=True,related_name='+')
+    product_name = models.CharField(max_length=100,blank=True,default='')
+    quantity = models.IntegerField(default=0)
+    price = models.FloatField(default=0)
+
+    class Meta:
+        db_table = "store_orderitem_archive"
+
+
+class DailySales(models.Model):
+    # per-day sales rollups kept up to date by store.analytics; revenue is the sum of the order lines.
+    # each day is spread over ROLLUP_SHARDS rows so concurrent checkouts don't queue on one row lock;
+    # the report sums the shards
+    day = models.DateField()
+    shard = models.SmallIntegerField(default=0)
+    orders = models.IntegerField(default=0)
+    units = models.IntegerField(default=0)
+    revenue = models.FloatField(default=0)
+    paid_orders = models.IntegerField(default=0)
+    paid_revenue = models.FloatField(default=0)
+
+    class Meta:
+        db_table = "analytics_daily_sales"
+        constraints = [
+            models.UniqueConstraint(fields=['day','shard'],name='unique_daily_sales'),
+        ]
+
+
+class DailyProductSales(models.Model):
+    day = models.DateField()
+    shard = models.SmallIntegerField(default=0)
+    product = models.ForeignKey(Product,on_delete=models.SET_NULL,null=True)
+    product_name = models.CharField(max_length=100,blank=True,default='')
+    orders = models.IntegerField(default=0)
+    units = models.IntegerField(default=0)
+    revenue = models.FloatField(default=0)
+
+    class Meta:
+        db_table = "analytics_daily_product_sales"
+        constraints = [
+            models.UniqueConstraint(fields=['day','product','shard'],name='unique_daily_product_sales'),
+        ]
+
+
+class DailyCategorySales(models.Model):
+    day = models.DateField()
+    shard = models.SmallIntegerField(default=0)
+    category = models.CharField(max_length=100,blank=True,default='')
+    orders = models.IntegerField(default=0)
+    units = models.IntegerField(default=0)
+    revenue = models.FloatField(default=0)
+
+    class Meta:
+        db_table = "analytics_daily_category_sales"
+        constraints = [
+            models.UniqueConstraint(fields=['day','category','shard'],name='unique_daily_category_sales'),
+        ]
@@ -0,0 +1,92 @@
+from datetime import datetime,time,timedelta
+from django.utils import timezone
+from django.utils.dateparse import parse_date,parse_datetime
+from .models import Order,OrderItem,ShippingAddress
+
+# order listings read only this much of the live orders unless the caller asks for the history
+RECENT_ORDERS_WINDOW = timedelta(days=180)
+# the query parameters filter_orders understands
+ORDER_FILTERS = ('is_paid','is_delivered','created_after','created_before')
+
+
+def _parse_boolean(param,value):
+    value = value.lower()
+    if value in ('1','true','yes'):
+        return True
+    if value in ('0','false','no'):
+        return False
+    raise ValueError(f'{param} must be true or false')
+
+
+def _parse_moment(param,value,end_of_day=False):
+    moment = parse_datetime(value)
+    if moment is None:
+        day = parse_date(value)
+        if day is None:
+            raise ValueError(f'{param} must be a date (YYYY-MM-DD) or an ISO 8601 datetime')
+        moment = datetime.combine(day,time.max if end_of_day else time.min)
+    if timezone.is_naive(moment):
+        moment = timezone.make_aware(moment)
+    return moment
+
+
+def filter_orders(queryset,query_params):
+    """Apply is_paid, is_delivered, created_after and created_before from `query_params`.
+
+    Raises ValueError with a readable message for malformed values. A bare date in
+    created_before includes that whole day.
+    """
+    for param in ('is_paid','is_delivered'):
+        value = query_params.get(param)
+        if value not in (None,''):
+            queryset = queryset.filter(**{param:_parse_boolean(param,value)})
+    created_after = query_params.get('created_after')
+    if created_after:
+        queryset = queryset.filter(created_at__gte = _parse_moment('created_after',created_after))
+    created_before = query_params.get('created_before')
+    if created_before:
+        queryset = queryset.filter(created_at__lte = _parse_moment('created_before',created_before,end_of_day=True))
+    return queryset
+
+
+def recent_orders(queryset,query_params):
+    """Limit an Order queryset to the last RECENT_ORDERS_WINDOW unless `history` is true in `query_params`.
+
+    Keeps the scan on the newest end of the created_at indexes. Raises ValueError for a malformed flag.
+    """
+    value = query_params.get('history')
+    if value not in (None,'') and _parse_boolean('history',value):
+        return queryset
+    return queryset.filter(created_at__gte = timezone.now() - RECENT_ORDERS_WINDOW)
+
+
+def wants_archive(query_params):
+    value = query_params.get('archived')
+    return value not in (None,'') and _parse_boolean('archived',value)
+
+
+def create_order(user,data,lines):
+    """Insert an order with its shipping address and items; `lines` is a list of (product, quantity, unit_price).
+
+    `data` carries payment_method, tax_price, shipping_price and shipping_address as in the
+    placeorder payload. Stock is left to the caller; call inside transaction.atomic.
+    """
+    total_price = sum(quantity * price for _,quantity,price in lines)
+    order = Order.objects.create(
+        user=user,
+        payment_method=data.get('payment_method'),
+        tax_price=data.get('tax_price'),
+        shipping_price=data.get('shipping_price', 50),  # Default to 50 if not provided
+        total_price=total_price - data.get('tax_price'),
+    )
+    ShippingAddress.objects.create(
+        order=order,
+        country=data['shipping_address']['country'],
+        city=data['shipping_address']['city'],
+        postal_code=data['shipping_address']['postal_code']
+    )
+    OrderItem.objects.bulk_create([
+        OrderItem(order=order, product=product, product_name=product.name, quantity=quantity, price=price)
+        for product, quantity, price in lines
+    ])
+    return order
@@ -0,0 +1,23 @@
+from rest_framework.pagination import CursorPagination
+
+
+class ProductCursorPagination(CursorPagination):
+    # keyset pagination: every page is a "WHERE created_at > <cursor> ORDER BY created_at, id LIMIT n"
+    # so deep pages cost the same as the first one
+    page_size = 20
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+    ordering = ('created_at', 'id')
+
+
+class SearchCursorPagination(ProductCursorPagination):
+    # search hits are paged by relevance; ties on the rank fall back to the cursor offset
+    ordering = ('-rank','id')
+
+
+class OrderCursorPagination(CursorPagination):
+    # newest orders first, keyed on (created_at, id) like the product listing
+    page_size = 20
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+    ordering = ('-created_at','-id')
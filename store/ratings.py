@@ -0,0 +1,59 @@
+from decimal import Decimal
+from django.db.models import Avg,Case,Count,DecimalField,F,OuterRef,Subquery,Sum,Value,When
+from django.db.models.functions import Cast,Coalesce,Now
+from django.db.models.lookups import GreaterThan
+from django.utils import timezone
+from .cache import invalidate_product
+from .models import Product,Review
+
+
+RATING_FIELD = DecimalField(max_digits=10,decimal_places=2)
+
+
+def apply_review_delta(product_id,rating_delta,count_delta):
+    """Fold one review write into the product's running rating sum and count.
+
+    A single UPDATE with F() expressions, so concurrent reviews never lose each
+    other's changes; call it inside the transaction that writes the review.
+    """
+    rating_sum = F('rating_sum') + Value(Decimal(rating_delta))
+    num_reviews = F('num_reviews') + count_delta
+    Product.objects.filter(id = product_id).update(
+        rating_sum = rating_sum,
+        num_reviews = num_reviews,
+        rating = Case(
+            When(GreaterThan(num_reviews,0),then=rating_sum / num_reviews),
+            default=Value(Decimal('0')),
+            output_field=RATING_FIELD,
+        ),
+        # reviews are part of the product payload, so the conditional-GET validator has to move
+        updated_at = timezone.now(),
+    )
+
+
+def rebuild_product_ratings(start_id,end_id):
+    """Recompute rating_sum, num_reviews and rating for products with start_id <= id < end_id.
+
+    Only the products whose stored values were off are written; their updated_at moves and
+    their cached payloads are dropped once the transaction commits. Returns how many were fixed.
+    """
+    reviews = Review.objects.filter(product=OuterRef('pk')).order_by().values('product')
+    total = Subquery(reviews.annotate(total=Sum('rating')).values('total'))
+    count = Subquery(reviews.annotate(count=Count('id')).values('count'))
+    average = Subquery(reviews.annotate(average=Avg('rating')).values('average'))
+    values = {
+        'rating_sum':Coalesce(total,Value(Decimal('0')),output_field=DecimalField(max_digits=12,decimal_places=2)),
+        'num_reviews':Coalesce(count,Value(0)),
+        'rating':Coalesce(Cast(average,RATING_FIELD),Value(Decimal('0')),output_field=RATING_FIELD),
+    }
+    stale = list(
+        Product.objects.filter(id__gte = start_id,id__lt = end_id)
+        .annotate(**{f'expected_{field}':value for field,value in values.items()})
+        .exclude(**{field:F(f'expected_{field}') for field in values})
+        .values_list('id',flat=True)
+    )
+    if stale:
+        Product.objects.filter(id__in = stale).update(updated_at = Now(),**values)
+    for product_id in stale:
+        invalidate_product(product_id)
+    return len(stale)
@@ -0,0 +1,59 @@
+import hashlib
+from django.contrib.postgres.search import SearchQuery,SearchRank,TrigramWordSimilarity
+from django.core.cache import cache
+from django.db.models import F,Q
+from django.db.models.functions import Greatest
+from .models import Product
+
+
+SEARCH_CONFIG = 'english'
+AUTOCOMPLETE_MIN_LENGTH = 2
+AUTOCOMPLETE_LIMIT = 10
+AUTOCOMPLETE_MAX_LIMIT = 20
+AUTOCOMPLETE_CACHE_TIMEOUT = 60
+
+
+def search_products_queryset(term):
+    """Products matching `term`, best matches first.
+
+    Matching goes through the GIN index on Product.search_vector, so only the
+    matching rows are read and ranked; the rank is exposed as `rank` for ordering.
+    """
+    query = SearchQuery(term,search_type='websearch',config=SEARCH_CONFIG)
+    return (
+        Product.objects.filter(search_vector=query)
+        .annotate(rank=SearchRank(F('search_vector'),query))
+    )
+
+
+def _autocomplete_cache_key(term,limit):
+    digest = hashlib.md5(term.encode()).hexdigest()
+    return f'store:autocomplete:{limit}:{digest}'
+
+
+def autocomplete_products(term,limit=AUTOCOMPLETE_LIMIT):
+    """Top `limit` products whose name or brand looks like what the user is typing.
+
+    Uses trigram word similarity, which tolerates typos and partial words and is
+    answered from the gin_trgm_ops indexes on name/brand. Results for each prefix
+    are cached briefly since every user types the same first few letters.
+    """
+    term = ' '.join(term.lower().split())
+    if len(term) < AUTOCOMPLETE_MIN_LENGTH:
+        return []
+    key = _autocomplete_cache_key(term,limit)
+    suggestions = cache.get(key)
+    if suggestions is None:
+        suggestions = list(
+            Product.objects.filter(
+                Q(name__trigram_word_similar=term) | Q(brand__trigram_word_similar=term)
+            )
+            .annotate(similarity=Greatest(
+                TrigramWordSimilarity(term,'name'),
+                TrigramWordSimilarity(term,'brand'),
+            ))
+            .order_by('-similarity','id')
+            .values('id','name')[:limit]
+        )
+        cache.set(key,suggestions,AUTOCOMPLETE_CACHE_TIMEOUT)
+    return suggestions
@@ -1,6 +1,83 @@
+from decimal import Decimal
 from rest_framework import serializers
 from django.contrib.auth.models import User
-from .models import Product,Review,Order,ShippingAddress,OrderItem,Order_Products
+from django.db.models import prefetch_related_objects
+from .models import Product,Review,Order,ShippingAddress,OrderItem,ArchivedOrder,ArchivedOrderItem,Cart,CartLine
+
+
+def parse_sparse_fields(query_params):
+    """Read ?fields=a,b and ?expand=c,d; a parameter that isn't given comes back as None."""
+    def split(name):
+        value = query_params.get(name)
+        if value is None:
+            return None
+        return [part.strip() for part in value.split(',') if part.strip()]
+    return split('fields'),split('expand')
+
+
+class SparseFieldsMixin:
+    """Lets a ModelSerializer render only the fields and embeds a client asked for.
+
+    Without `fields` every field and every embed is rendered, as before. With `fields`
+    only those are kept, plus any embed named in `expand`. setup_eager_loading uses the
+    same rules to select only the needed columns and skip unused related queries.
+    """
+    # nested/related fields and the queryset change each one needs
+    expandable_fields = {}
+    # columns every queryset must load (e.g. the pagination ordering)
+    always_load = ('id',)
+
+    def __init__(self,*args,**kwargs):
+        fields = kwargs.pop('fields',None)
+        expand = kwargs.pop('expand',None)
+        super().__init__(*args,**kwargs)
+        if fields is not None:
+            keep = set(fields) | set(expand or ())
+            for name in list(self.fields):
+                if name not in keep:
+                    self.fields.pop(name)
+
+    @classmethod
+    def wanted_embeds(cls,fields,expand):
+        if fields is None:
+            return set(cls.expandable_fields)
+        return set(cls.expandable_fields) & (set(fields) | set(expand or ()))
+
+    @classmethod
+    def setup_eager_loading(cls,queryset,fields=None,expand=None,prefetch=True):
+        """Limit the columns and join/prefetch the embeds; prefetch=False leaves the
+        prefetches to prefetch_embeds, for when the rows may not get serialized."""
+        embeds = cls.wanted_embeds(fields,expand)
+        if fields is not None:
+            model_fields = {field.name for field in cls.Meta.model._meta.concrete_fields}
+            columns = set(cls.always_load) | (model_fields & set(fields))
+            for embed in embeds:
+                columns |= set(cls.expandable_fields[embed].get('columns',()))
+            queryset = queryset.only(*columns)
+        for embed in embeds:
+            options = cls.expandable_fields[embed]
+            if options.get('select_related'):
+                queryset = queryset.select_related(*options['select_related'])
+            if prefetch and options.get('prefetch_related'):
+                queryset = queryset.prefetch_related(*options['prefetch_related'])
+        return queryset
+
+    @classmethod
+    def prefetch_embeds(cls,instances,fields=None,expand=None):
+        lookups = [
+            lookup for embed in cls.wanted_embeds(fields,expand)
+            for lookup in cls.expandable_fields[embed].get('prefetch_related',())
+        ]
+        if lookups:
+            prefetch_related_objects(instances,*lookups)
+
+    @classmethod
+    def project(cls,payload,fields,expand):
+        """Apply the same field selection to an already-serialized payload."""
+        if fields is None:
+            return payload
+        keep = set(fields) | set(expand or ())
+        return {key:value for key,value in payload.items() if key in keep}
 
 class ShippingAddressSerializer(serializers.ModelSerializer):
     class Meta:
@@ -9,9 +86,12 @@ class ShippingAddressSerializer(serializers.ModelSerializer):
 
 
 class OrderItemSerializer(serializers.ModelSerializer):
-    # order_item = serializers.SerializerMethodField(read_only = True)
-    # def get_order_item(self,obj):
-    #     return obj.product.id
+    product = serializers.SerializerMethodField(read_only = True)
+
+    def get_product(self,obj):
+        # rendered as a list of ids, as it was when product was a many-to-many field
+        return [obj.product_id] if obj.product_id is not None else []
+
     class Meta:
         model = OrderItem
         fields = "__all__"
@@ -31,32 +111,78 @@ class ReviewSerializer(serializers.ModelSerializer):
     class Meta:
         model = Review
         fields = '__all__'
+        # keeps the product's running average inside its valid_rating check
+        extra_kwargs = {'rating':{'min_value':Decimal('0'),'max_value':Decimal('5')}}
 
 
-class ProductSerializer(serializers.ModelSerializer):
+class ProductSerializer(SparseFieldsMixin,serializers.ModelSerializer):
     reviews = serializers.SerializerMethodField(read_only = True)
+    # one batched query for the reviews of every product in the queryset
+    expandable_fields = {
+        'reviews':{'prefetch_related':['product_reviews']},
+    }
+    always_load = ('id','created_at')
+
     def get_reviews(self,obj):
-        reviews = Review.objects.filter(product=obj)
+        # the related manager hands each review its parent product,
+        # so ReviewSerializer.get_product doesn't fetch it again
+        reviews = obj.product_reviews.all()
         serializer = ReviewSerializer(reviews,many=True)
         return serializer.data
     class Meta:
         model = Product
-        fields = '__all__'
+        exclude = ['search_vector']
+        # maintained from the reviews and by the database, never taken from a request
+        read_only_fields = ['rating','rating_sum','num_reviews','updated_at']
 
 
-class OrderSerializer(serializers.ModelSerializer):
+class OrderSerializer(SparseFieldsMixin,serializers.ModelSerializer):
     user_data = UserSerializer(source='user', read_only=True)
     shipping_address = ShippingAddressSerializer(source='order_shipping', read_only=True)
     order_items = OrderItemSerializer(many=True, read_only=True, source='orderitem_set')
+    expandable_fields = {
+        'user_data':{'select_related':['user'],'columns':['user']},
+        'shipping_address':{'select_related':['order_shipping']},
+        'order_items':{'prefetch_related':['orderitem_set']},
+    }
+    # created_at for the pagination ordering; user and updated_at for the ownership check and the ETag
+    always_load = ('id','created_at','user','updated_at')
 
     class Meta:
         model = Order
         fields = '__all__'
 
 
+class ArchivedOrderItemSerializer(serializers.ModelSerializer):
+    product = serializers.SerializerMethodField(read_only = True)
+
+    def get_product(self,obj):
+        return [obj.product_id] if obj.product_id is not None else []
+
+    class Meta:
+        model = ArchivedOrderItem
+        exclude = ['order']
 
-class OrderProductSerializer(serializers.ModelSerializer):
-    model = Order_Products
-    fields = '__all__'
 
+class ArchivedOrderSerializer(serializers.ModelSerializer):
+    order_items = ArchivedOrderItemSerializer(many=True, read_only=True, source='items')
 
+    class Meta:
+        model = ArchivedOrder
+        fields = '__all__'
+
+
+class CartLineSerializer(serializers.ModelSerializer):
+    product_name = serializers.CharField(source='product.name', read_only=True)
+
+    class Meta:
+        model = CartLine
+        exclude = ['cart']
+
+
+class CartSerializer(serializers.ModelSerializer):
+    lines = CartLineSerializer(many=True, read_only=True)
+
+    class Meta:
+        model = Cart
+        exclude = ['user']
@@ -0,0 +1,61 @@
+from asgiref.sync import sync_to_async
+from django.core.handlers.asgi import ASGIRequest
+from django.http import StreamingHttpResponse
+from rest_framework.renderers import JSONRenderer
+
+
+STREAM_CHUNK_SIZE = 500
+
+
+def wants_stream(request):
+    return request.query_params.get('stream','').lower() in ('1','true','yes')
+
+
+def _render_batch(serializer_class,batch,serializer_kwargs):
+    # render through the same renderer Response uses so the items are byte-for-byte
+    # what the non-streaming endpoint returns, then drop the surrounding brackets
+    return JSONRenderer().render(serializer_class(batch,many=True,**serializer_kwargs).data)[1:-1]
+
+
+def _served_async(request):
+    return isinstance(getattr(request,'_request',request),ASGIRequest)
+
+
+async def _aiter_sync(chunks):
+    # Django's ASGI handler reads a sync iterator into a list before sending any of it, so
+    # under ASGI the chunks are handed over one at a time instead. thread_sensitive keeps every
+    # step on the thread that owns the database connection and its server-side cursor
+    next_chunk = sync_to_async(next,thread_sensitive=True)
+    try:
+        while True:
+            chunk = await next_chunk(chunks,None)
+            if chunk is None:
+                return
+            yield chunk
+    finally:
+        await sync_to_async(chunks.close,thread_sensitive=True)()
+
+
+def stream_serialized(request,queryset,serializer_class,chunk_size=STREAM_CHUNK_SIZE,**serializer_kwargs):
+    """Serialize a queryset as one JSON array without holding it in memory.
+
+    Rows are pulled with .iterator(chunk_size) (prefetch_related is honoured per chunk)
+    and every chunk is rendered and written out before the next one is fetched, under
+    WSGI and ASGI alike.
+    """
+    def generate():
+        yield b'['
+        first = True
+        batch = []
+        for obj in queryset.iterator(chunk_size=chunk_size):
+            batch.append(obj)
+            if len(batch) == chunk_size:
+                yield (b'' if first else b',') + _render_batch(serializer_class,batch,serializer_kwargs)
+                first = False
+                batch = []
+        if batch:
+            yield (b'' if first else b',') + _render_batch(serializer_class,batch,serializer_kwargs)
+        yield b']'
+
+    content = _aiter_sync(generate()) if _served_async(request) else generate()
+    return StreamingHttpResponse(content,content_type='application/json')
@@ -8,14 +8,25 @@ urlpatterns = [
     path('product/update/<int:pk>',views.update_product,name='update_product'),
     path('product/delete/<int:pk>',views.delete_product,name='delete_product'),
     path('product/upload_image/<int:pk>',views.upload_image ,name='upload_image'),
+    path('products/cache_stats',views.get_product_cache_stats,name='product_cache_stats'),
     path('products/search_products/<str:search_param>',views.search_products,name='search_products'),
+    path('products/autocomplete',views.autocomplete,name='autocomplete'),
+    path('products/<int:pk>/create_review',views.create_review,name='create_review'),
     path('products/<int:pk>/update_review',views.update_review,name='update_review'),
     path('product/<int:pk>/delete_review',views.delete_review,name='delete_review'),
     path('getorder/<int:pk>',views.get_order_by_id,name='get_order_by_id'),
     path('updateordertopaid/<int:pk>',views.UpdateOrderToPaid,name='UpdateOrderToPaid'),
     path('updateordertodelievered/<int:pk>',views.UpdateOrderToDelievered,name='UpdateOrderToDelievered'),
+    path('orders/bulk/mark_paid',views.bulk_mark_orders_paid,name='bulk_mark_orders_paid'),
+    path('orders/bulk/mark_delivered',views.bulk_mark_orders_delivered,name='bulk_mark_orders_delivered'),
     path('placeorder', views.addOrderItems, name='addOrderItems'),
+    path('cart',views.get_cart,name='get_cart'),
+    path('cart/items/<int:pk>',views.update_cart_item,name='update_cart_item'),
+    path('cart/clear',views.clear_cart,name='clear_cart'),
+    path('cart/checkout',views.checkout_cart,name='checkout_cart'),
     path('get_all_orders',views.get_all_orders,name='get_all_orders'),
     path('get_my_orders',views.get_my_orders,name='get_my_orders'),
+    path('orders/events',views.order_events_stream,name='order_events_stream'),
+    path('analytics/',views.get_sales_report,name='sales_report'),
     
 ]
\ No newline at end of file
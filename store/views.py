@@ -1,14 +1,38 @@
 # from django.shortcuts import render
-from rest_framework.decorators import api_view,permission_classes
-from .models import Product,Order,Review,OrderItem,ShippingAddress
+from rest_framework.decorators import api_view,permission_classes,authentication_classes
+from .models import Product,Order,Review,ArchivedOrder
 from django.shortcuts import get_object_or_404
-from .serializers import ProductSerializer,OrderSerializer,ReviewSerializer,OrderItemSerializer
-from rest_framework.permissions import IsAuthenticated,IsAdminUser,BasePermission
+from django.db import transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from .serializers import ProductSerializer,OrderSerializer,ReviewSerializer,OrderItemSerializer,ArchivedOrderSerializer,CartSerializer,parse_sparse_fields
+from .pagination import ProductCursorPagination,SearchCursorPagination,OrderCursorPagination
+from .orders import create_order,filter_orders,recent_orders,wants_archive,RECENT_ORDERS_WINDOW
+from .search import search_products_queryset,autocomplete_products,AUTOCOMPLETE_LIMIT,AUTOCOMPLETE_MAX_LIMIT
+from .streaming import stream_serialized,wants_stream
+from .cache import get_cached_product,invalidate_product,product_cache_stats
+from .conditional import validator_for,object_validator,not_modified,with_validators
+from .ratings import apply_review_delta
+from .catalog import filter_products,facet_counts,adjust_facets
+from .inventory import reserve_stock,InsufficientStock
+from .idempotency import idempotent
+from .loaders import load_object,load_owned,OwnerPermission
+from .fulfilment import bulk_transition,BULK_TRANSITION_LIMIT
+from . import carts
+from .carts import CART_RESERVATION_TTL
+from .events import publish_order_event,order_events
+from .analytics import record_order_placed,record_order_paid,parse_report_params,sales_report,ROLLUP_GROUPS
+from rest_framework.permissions import IsAuthenticated,IsAdminUser
 from rest_framework.response import Response
 from rest_framework import status
-from django.db.models import Q
-from datetime import datetime
 from decimal import Decimal
+from django.http import Http404,JsonResponse,StreamingHttpResponse
+from django.core.serializers.json import DjangoJSONEncoder
+from asgiref.sync import sync_to_async
+from authon.authentication import CachedJWTAuthentication,TokenUserAuthentication
+from rest_framework_simplejwt.exceptions import InvalidToken,AuthenticationFailed
+import asyncio
+import json
 from drf_yasg import openapi
 from drf_yasg.utils import swagger_auto_schema
 # Create your views here.
@@ -19,27 +43,117 @@ from drf_yasg.utils import swagger_auto_schema
 @swagger_auto_schema(
     method='get',
     operation_summary="Retrieve all products",
-    operation_description="This endpoint allows administrators to fetch all available products in the database. Only users with admin privileges can access this endpoint.",
+    operation_description="This endpoint allows administrators to fetch all available products in the database, one page at a time ordered by creation date. Only users with admin privileges can access this endpoint.",
+    manual_parameters=[
+        openapi.Parameter(
+            'cursor',
+            openapi.IN_QUERY,
+            description="Opaque cursor taken from the `next` or `previous` link of a previous page",
+            type=openapi.TYPE_STRING,
+            required=False,
+        ),
+        openapi.Parameter(
+            'page_size',
+            openapi.IN_QUERY,
+            description="Number of products per page (default 20, max 100)",
+            type=openapi.TYPE_INTEGER,
+            required=False,
+        ),
+        openapi.Parameter(
+            'stream',
+            openapi.IN_QUERY,
+            description="Stream the whole catalog as a single JSON array of products instead of one page",
+            type=openapi.TYPE_BOOLEAN,
+            required=False,
+        ),
+        openapi.Parameter(
+            'fields',
+            openapi.IN_QUERY,
+            description="Comma separated list of product fields to return, e.g. `id,name,price`; all fields when omitted",
+            type=openapi.TYPE_STRING,
+            required=False,
+        ),
+        openapi.Parameter(
+            'expand',
+            openapi.IN_QUERY,
+            description="Comma separated list of embeds to include alongside `fields` (`reviews`)",
+            type=openapi.TYPE_STRING,
+            required=False,
+        ),
+        openapi.Parameter(
+            'category',
+            openapi.IN_QUERY,
+            description="Only products in this category; brand facet counts are then scoped to it",
+            type=openapi.TYPE_STRING,
+            required=False,
+        ),
+        openapi.Parameter(
+            'brand',
+            openapi.IN_QUERY,
+            description="Only products of these brands (comma separated)",
+            type=openapi.TYPE_STRING,
+            required=False,
+        ),
+        openapi.Parameter(
+            'min_price',
+            openapi.IN_QUERY,
+            description="Lowest price to include",
+            type=openapi.TYPE_NUMBER,
+            required=False,
+        ),
+        openapi.Parameter(
+            'max_price',
+            openapi.IN_QUERY,
+            description="Highest price to include",
+            type=openapi.TYPE_NUMBER,
+            required=False,
+        ),
+        openapi.Parameter(
+            'in_stock',
+            openapi.IN_QUERY,
+            description="Only products with count_in_stock above zero",
+            type=openapi.TYPE_BOOLEAN,
+            required=False,
+        ),
+        openapi.Parameter(
+            'min_rating',
+            openapi.IN_QUERY,
+            description="Lowest average rating to include",
+            type=openapi.TYPE_NUMBER,
+            required=False,
+        ),
+    ],
     responses={
+        304: openapi.Response(
+            description="Not Modified - The ETag in If-None-Match (or the If-Modified-Since date) still matches",
+        ),
         200: openapi.Response(
-            description="List of all products",
+            description="A page of products",
             examples={
-                "application/json": [
-                    {
-                        "id": 1,
-                        "name": "Product A",
-                        "price": 100.00,
-                        "description": "Description of Product A",
-                        "stock": 20,
-                    },
-                    {
-                        "id": 2,
-                        "name": "Product B",
-                        "price": 200.00,
-                        "description": "Description of Product B",
-                        "stock": 15,
+                "application/json": {
+                    "next": "http://example.com/api/products/?cursor=cD0yMDI0LTA5LTA2",
+                    "previous": None,
+                    "results": [
+                        {
+                            "id": 1,
+                            "name": "Product A",
+                            "price": 100.00,
+                            "description": "Description of Product A",
+                            "stock": 20,
+                        },
+                        {
+                            "id": 2,
+                            "name": "Product B",
+                            "price": 200.00,
+                            "description": "Description of Product B",
+                            "stock": 15,
+                        }
+                    ],
+                    "facets": {
+                        "category": {"phones": 120, "laptops": 45},
+                        "brand": {"Apple": 30, "Samsung": 25}
                     }
-                ]
+                }
             },
         ),
         400: openapi.Response(
@@ -52,14 +166,35 @@ from drf_yasg.utils import swagger_auto_schema
 @permission_classes([IsAdminUser])
 def get_all_products(request):
     try:
-        products = Product.objects.all()
-        serializer = ProductSerializer(products,many = True)
-        return Response(serializer.data,status=status.HTTP_200_OK)
+        etag,last_modified = validator_for(Product.objects.all(),'products')
+        unchanged = not_modified(request,etag,last_modified)
+        if unchanged:
+            return unchanged
+        try:
+            products = filter_products(Product.objects.all(),request.query_params)
+        except ValueError as ex:
+            return Response({'error':str(ex)},status=status.HTTP_400_BAD_REQUEST)
+        fields,expand = parse_sparse_fields(request.query_params)
+        products = ProductSerializer.setup_eager_loading(products,fields,expand)
+        if wants_stream(request):
+            response = stream_serialized(request,products.order_by('created_at','id'),ProductSerializer,fields=fields,expand=expand)
+        else:
+            paginator = ProductCursorPagination()
+            page = paginator.paginate_queryset(products,request)
+            serializer = ProductSerializer(page,many = True,fields=fields,expand=expand)
+            response = paginator.get_paginated_response(serializer.data)
+            response.data['facets'] = facet_counts(request.query_params.get('category'))
+        return with_validators(response,etag,last_modified)
     except:
         return Response(status=status.HTTP_400_BAD_REQUEST)
     
 
 
+def _load_product_payload(pk):
+    product = ProductSerializer.setup_eager_loading(Product.objects.all()).get(id = pk)
+    return ProductSerializer(product).data
+
+
 @swagger_auto_schema(
     method='get',
     operation_summary="Retrieve a specific product by ID",
@@ -71,9 +206,26 @@ def get_all_products(request):
             description="The ID of the product to retrieve",
             type=openapi.TYPE_INTEGER,
             required=True
-        )
+        ),
+        openapi.Parameter(
+            'fields',
+            openapi.IN_QUERY,
+            description="Comma separated list of product fields to return, e.g. `id,name,price`; all fields when omitted",
+            type=openapi.TYPE_STRING,
+            required=False,
+        ),
+        openapi.Parameter(
+            'expand',
+            openapi.IN_QUERY,
+            description="Comma separated list of embeds to include alongside `fields` (`reviews`)",
+            type=openapi.TYPE_STRING,
+            required=False,
+        ),
     ],
     responses={
+        304: openapi.Response(
+            description="Not Modified - The ETag in If-None-Match (or the If-Modified-Since date) still matches",
+        ),
         200: openapi.Response(
             description="Details of the requested product",
             examples={
@@ -99,9 +251,15 @@ def get_all_products(request):
 @api_view(['GET'])
 def get_product(request,pk):
     try:
-        product = Product.objects.get(id = pk)
-        serializer = ProductSerializer(product)
-        return Response(serializer.data ,status=status.HTTP_200_OK)
+        payload = get_cached_product(pk,_load_product_payload)
+        # validators from the payload itself, so the ETag always describes the body that is sent
+        etag,last_modified = object_validator(f'product-{pk}',parse_datetime(payload['updated_at']))
+        unchanged = not_modified(request,etag,last_modified)
+        if unchanged:
+            return unchanged
+        fields,expand = parse_sparse_fields(request.query_params)
+        payload = ProductSerializer.project(payload,fields,expand)
+        return with_validators(Response(payload ,status=status.HTTP_200_OK),etag,last_modified)
     except Product.DoesNotExist:
         return Response(status=status.HTTP_404_NOT_FOUND)
     except:
@@ -163,7 +321,9 @@ def create_product(request):
     try:
         serialezer = ProductSerializer(data = data)
         if serialezer.is_valid():
-            serialezer.save()
+            with transaction.atomic():
+                product = serialezer.save()
+                adjust_facets(product.category,product.brand,1)
             return Response(serialezer.data,status=status.HTTP_201_CREATED)
         else :
             return Response(serialezer.errors,status=status.HTTP_400_BAD_REQUEST)
@@ -232,16 +392,22 @@ def create_product(request):
     security=[{"Bearer": []}],
 )
 
-@permission_classes([IsAdminUser])
 @api_view(['PUT'])
+@permission_classes([IsAdminUser])
 def update_product(request , pk):
     try :
         data = request.data
         product = Product.objects.get(id = pk)
         data['user'] = request.user.id
+        old_facets = (product.category,product.brand)
         serializer = ProductSerializer(data = data ,instance = product ,partial= True)
         if serializer.is_valid():
-            serializer.save()
+            with transaction.atomic():
+                product = serializer.save()
+                if (product.category,product.brand) != old_facets:
+                    adjust_facets(*old_facets,-1)
+                    adjust_facets(product.category,product.brand,1)
+            invalidate_product(pk)
             return Response(serializer.data , status=status.HTTP_200_OK)
         else : 
             return Response(serializer.errors , status=status.HTTP_400_BAD_REQUEST)
@@ -281,11 +447,16 @@ def update_product(request , pk):
     },
     security=[{"Bearer": []}],
 )
-@permission_classes([IsAdminUser])
 @api_view(['DELETE'])
+@permission_classes([IsAdminUser])
 def delete_product(request , pk):
     try:
-        Product.objects.filter(id = pk).delete()
+        with transaction.atomic():
+            product = Product.objects.select_for_update().filter(id = pk).values('category','brand').first()
+            if product is not None:
+                Product.objects.filter(id = pk).delete()
+                adjust_facets(product['category'],product['brand'],-1)
+        invalidate_product(pk)
         return Response(status=status.HTTP_204_NO_CONTENT)
     except Exception as ex:
         return Response({'error':f'{str(ex)}'})
@@ -358,52 +529,168 @@ def upload_image(request, pk):
                         status=status.HTTP_400_BAD_REQUEST)
     product.image = request.FILES['image']
     product.save()
+    invalidate_product(pk)
     serializer = ProductSerializer(product)
     return Response(serializer.data, status=status.HTTP_200_OK)
 
 
 
+@swagger_auto_schema(
+    method='get',
+    operation_summary="Product cache statistics",
+    operation_description=(
+        "This endpoint allows administrators to see how the product detail cache is performing "
+        "in the worker that answers the request: hits, misses and the resulting hit rate."
+    ),
+    responses={
+        200: openapi.Response(
+            description="Cache counters",
+            examples={
+                "application/json": {
+                    "hits": 950,
+                    "misses": 50,
+                    "hit_rate": 0.95
+                }
+            },
+        ),
+    },
+    security=[{"Bearer": []}],
+)
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+def get_product_cache_stats(request):
+    return Response(product_cache_stats(),status=status.HTTP_200_OK)
+
+
+
 
 @swagger_auto_schema(
     method='get',
     operation_summary="Search for products",
     operation_description=(
         "This endpoint allows authenticated users to search for products based on a search parameter. "
-        "The search checks if the product's name or description contains the specified parameter (case-insensitive)."
+        "The parameter is matched against the product's name, brand, category and description using full-text search, "
+        "and results are returned best match first (name matches rank above brand/category, which rank above description)."
     ),
     manual_parameters=[
         openapi.Parameter(
             'search_param',
             openapi.IN_PATH,
-            description="The search parameter used to filter products by name or description",
+            description="The search terms; supports quoted phrases, `or` and `-excluded` words",
             type=openapi.TYPE_STRING,
             required=True,
         ),
+        openapi.Parameter(
+            'cursor',
+            openapi.IN_QUERY,
+            description="Opaque cursor taken from the `next` or `previous` link of a previous page",
+            type=openapi.TYPE_STRING,
+            required=False,
+        ),
+        openapi.Parameter(
+            'page_size',
+            openapi.IN_QUERY,
+            description="Number of products per page (default 20, max 100)",
+            type=openapi.TYPE_INTEGER,
+            required=False,
+        ),
+        openapi.Parameter(
+            'fields',
+            openapi.IN_QUERY,
+            description="Comma separated list of product fields to return, e.g. `id,name,price`; all fields when omitted",
+            type=openapi.TYPE_STRING,
+            required=False,
+        ),
+        openapi.Parameter(
+            'expand',
+            openapi.IN_QUERY,
+            description="Comma separated list of embeds to include alongside `fields` (`reviews`)",
+            type=openapi.TYPE_STRING,
+            required=False,
+        ),
     ],
     responses={
         200: openapi.Response(
-            description="A list of products matching the search parameter",
+            description="A page of products matching the search parameter",
+            examples={
+                "application/json": {
+                    "next": None,
+                    "previous": None,
+                    "results": [
+                        {
+                            "id": 1,
+                            "name": "Product A",
+                            "price": 100.00,
+                            "description": "Description of Product A",
+                            "stock": 20,
+                            "image": "http://example.com/media/product_images/product_a.jpg",
+                        },
+                        {
+                            "id": 2,
+                            "name": "Product B",
+                            "price": 150.00,
+                            "description": "Description of Product B",
+                            "stock": 10,
+                            "image": "http://example.com/media/product_images/product_b.jpg",
+                        }
+                    ]
+                }
+            },
+        ),
+        401: openapi.Response(
+            description="Unauthorized - Authentication credentials were not provided or invalid",
+        ),
+    },
+    security=[{"Bearer": []}],
+)
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def search_products(request,search_param ):
+    fields, expand = parse_sparse_fields(request.query_params)
+    products = ProductSerializer.setup_eager_loading(search_products_queryset(search_param), fields, expand)
+    paginator = SearchCursorPagination()
+    page = paginator.paginate_queryset(products, request)
+    serializer = ProductSerializer(page, many=True, fields=fields, expand=expand) 
+    return paginator.get_paginated_response(serializer.data)
+
+
+
+@swagger_auto_schema(
+    method='get',
+    operation_summary="Autocomplete product names",
+    operation_description=(
+        "This endpoint returns the ids and names of the products that best match what the user has typed so far. "
+        "Matching is typo tolerant and covers the product name and brand. Queries shorter than two characters return an empty list."
+    ),
+    manual_parameters=[
+        openapi.Parameter(
+            'q',
+            openapi.IN_QUERY,
+            description="The text typed so far",
+            type=openapi.TYPE_STRING,
+            required=True,
+        ),
+        openapi.Parameter(
+            'limit',
+            openapi.IN_QUERY,
+            description="Maximum number of suggestions (default 10, max 20)",
+            type=openapi.TYPE_INTEGER,
+            required=False,
+        ),
+    ],
+    responses={
+        200: openapi.Response(
+            description="Suggestions ordered by similarity",
             examples={
                 "application/json": [
-                    {
-                        "id": 1,
-                        "name": "Product A",
-                        "price": 100.00,
-                        "description": "Description of Product A",
-                        "stock": 20,
-                        "image": "http://example.com/media/product_images/product_a.jpg",
-                    },
-                    {
-                        "id": 2,
-                        "name": "Product B",
-                        "price": 150.00,
-                        "description": "Description of Product B",
-                        "stock": 10,
-                        "image": "http://example.com/media/product_images/product_b.jpg",
-                    }
+                    {"id": 3, "name": "Apple iPhone 15"},
+                    {"id": 7, "name": "Apple iPhone 15 Pro"}
                 ]
             },
         ),
+        400: openapi.Response(
+            description="Bad Request - limit is not a number",
+        ),
         401: openapi.Response(
             description="Unauthorized - Authentication credentials were not provided or invalid",
         ),
@@ -412,12 +699,14 @@ def upload_image(request, pk):
 )
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
-def search_products(request,search_param ):
-    products = Product.objects.filter(
-        Q(name__icontains=search_param) | Q(description__icontains=search_param)
-    )
-    serializer = ProductSerializer(products, many=True) 
-    return Response(serializer.data, status=status.HTTP_200_OK)
+def autocomplete(request):
+    term = request.query_params.get('q','')
+    try:
+        limit = int(request.query_params.get('limit',AUTOCOMPLETE_LIMIT))
+    except ValueError:
+        return Response({'error':'limit must be a number'},status=status.HTTP_400_BAD_REQUEST)
+    limit = max(1,min(limit,AUTOCOMPLETE_MAX_LIMIT))
+    return Response(autocomplete_products(term,limit),status=status.HTTP_200_OK)
 
 #-------------------------------------------------------------------------------------------------
 
@@ -476,7 +765,7 @@ def search_products(request,search_param ):
 @permission_classes([IsAuthenticated])
 def get_product_reviews(request , pk) : 
     try : 
-        reviews = Review.objects.filter(product_id = pk ) 
+        reviews = Review.objects.filter(product_id = pk ).select_related('product')
         serializer = ReviewSerializer(reviews , many = True) 
         return Response(serializer.data , status=200)
     except :
@@ -543,6 +832,9 @@ def get_product_reviews(request , pk) :
         401: openapi.Response(
             description="Unauthorized - Authentication credentials were not provided or invalid",
         ),
+        404: openapi.Response(
+            description="Not Found - No product with this ID exists",
+        ),
     },
     security=[{"Bearer": []}],
 )
@@ -554,23 +846,21 @@ def create_review(request,pk):
     data['user'] = request.user.id
     serializer = ReviewSerializer(data = data)
     if serializer.is_valid():
-        serializer.save()
+        with transaction.atomic():
+            # locked so the product can't be deleted between this check and the commit
+            product = get_object_or_404(Product.objects.select_for_update().only('id','name'),pk=pk)
+            review = serializer.save(product = product)
+            apply_review_delta(pk,review.rating,1)
+        invalidate_product(pk)
         return Response(serializer.data,status=201)
     else:
         return Response(serializer.errors,status=400)
 
 
 
-class ReviewAuthentication(BasePermission):
-    def has_permission(self,request,view):
-        pk = view.kwargs['pk']
-        review = Review.objects.get(id = pk)
-        user_id = review.user_id
-        user = request.user
-        if user_id == user.id:
-            return True
-        else:
-            return False
+class ReviewAuthentication(OwnerPermission):
+    # the review views load the review locked, through load_owned
+    pass
 
 
 @swagger_auto_schema(
@@ -636,15 +926,20 @@ class ReviewAuthentication(BasePermission):
 @permission_classes([ReviewAuthentication])
 def update_review(request,pk):
     data = request.data
-    review = Review.objects.get(id = pk)
-    data['user'] = review.user_id
-    data['product'] = review.product_id
-    serializer = ReviewSerializer(data = data ,instance = review ,partial= True)
-    if serializer.is_vlalid():
-        serializer.save()
-        return Response(serializer.data,status = 200)
-    else:
-        return Response(serializer.errors,status=400)
+    with transaction.atomic():
+        # locked, so the delta starts from the rating as it is now; two concurrent edits
+        # would otherwise both subtract the same old rating
+        review = load_owned(request,Review.objects.select_for_update(),pk)
+        data['user'] = review.user_id
+        data['product'] = review.product_id
+        old_rating = review.rating
+        serializer = ReviewSerializer(data = data ,instance = review ,partial= True)
+        if not serializer.is_valid():
+            return Response(serializer.errors,status=400)
+        review = serializer.save()
+        apply_review_delta(review.product_id,Decimal(review.rating) - old_rating,0)
+    invalidate_product(review.product_id)
+    return Response(serializer.data,status = 200)
 
 
 
@@ -689,11 +984,18 @@ def update_review(request,pk):
 @api_view(["DELETE"])
 @permission_classes([ReviewAuthentication])
 def delete_review(request , pk) : 
-    try : 
-        Review.objects.filter(id = pk).delete()
-        return Response(status=status.HTTP_204_NO_CONTENT)
-    except Exception as ex : 
-        return Response({"detail" : f"error happen {str(ex)}"} , status=400)
+    with transaction.atomic():
+        # locked, so the rating taken back out is the one being deleted, not one a concurrent
+        # update_review replaced; a concurrent delete finds no row and gets a 404
+        review = load_owned(request,Review.objects.select_for_update(),pk)
+        try : 
+            with transaction.atomic():
+                review.delete()
+                apply_review_delta(review.product_id,-review.rating,-1)
+        except Exception as ex : 
+            return Response({"detail" : f"error happen {str(ex)}"} , status=400)
+    invalidate_product(review.product_id)
+    return Response(status=status.HTTP_204_NO_CONTENT)
 
 #-------------------------------------------------------------------------------
 #order functionalities =>
@@ -707,26 +1009,98 @@ def delete_review(request , pk) :
         "This endpoint allows admin users to retrieve a list of all orders in the system. "
         "Only users with admin privileges have access to this endpoint."
     ),
+    manual_parameters=[
+        openapi.Parameter(
+            'cursor',
+            openapi.IN_QUERY,
+            description="Opaque cursor taken from the `next` or `previous` link of a previous page",
+            type=openapi.TYPE_STRING,
+            required=False,
+        ),
+        openapi.Parameter(
+            'page_size',
+            openapi.IN_QUERY,
+            description="Number of orders per page (default 20, max 100)",
+            type=openapi.TYPE_INTEGER,
+            required=False,
+        ),
+        openapi.Parameter(
+            'is_paid',
+            openapi.IN_QUERY,
+            description="Only paid (true) or unpaid (false) orders",
+            type=openapi.TYPE_BOOLEAN,
+            required=False,
+        ),
+        openapi.Parameter(
+            'is_delivered',
+            openapi.IN_QUERY,
+            description="Only delivered (true) or undelivered (false) orders",
+            type=openapi.TYPE_BOOLEAN,
+            required=False,
+        ),
+        openapi.Parameter(
+            'created_after',
+            openapi.IN_QUERY,
+            description="Only orders placed on or after this date/datetime (ISO 8601)",
+            type=openapi.TYPE_STRING,
+            required=False,
+        ),
+        openapi.Parameter(
+            'created_before',
+            openapi.IN_QUERY,
+            description="Only orders placed on or before this date/datetime (ISO 8601)",
+            type=openapi.TYPE_STRING,
+            required=False,
+        ),
+        openapi.Parameter(
+            'stream',
+            openapi.IN_QUERY,
+            description="Stream the orders as the JSON array is serialized instead of building it in memory first",
+            type=openapi.TYPE_BOOLEAN,
+            required=False,
+        ),
+        openapi.Parameter(
+            'fields',
+            openapi.IN_QUERY,
+            description="Comma separated list of order fields to return, e.g. `id,name,price`; all fields when omitted",
+            type=openapi.TYPE_STRING,
+            required=False,
+        ),
+        openapi.Parameter(
+            'expand',
+            openapi.IN_QUERY,
+            description="Comma separated list of embeds to include alongside `fields` (`user_data`, `shipping_address`, `order_items`)",
+            type=openapi.TYPE_STRING,
+            required=False,
+        ),
+    ],
     responses={
+        304: openapi.Response(
+            description="Not Modified - The ETag in If-None-Match (or the If-Modified-Since date) still matches",
+        ),
         200: openapi.Response(
             description="A list of all orders",
             examples={
-                "application/json": [
-                    {
-                        "id": 1,
-                        "user": 5,
-                        "total_price": 150.00,
-                        "status": "completed",
-                        "created_at": "2024-11-18T10:30:00Z"
-                    },
-                    {
-                        "id": 2,
-                        "user": 8,
-                        "total_price": 220.00,
-                        "status": "pending",
-                        "created_at": "2024-11-17T14:15:00Z"
-                    }
-                ]
+                "application/json": {
+                    "next": "http://example.com/api/get_all_orders?cursor=cD0yMDI0LTExLTE4",
+                    "previous": None,
+                    "results": [
+                        {
+                            "id": 1,
+                            "user": 5,
+                            "total_price": 150.00,
+                            "status": "completed",
+                            "created_at": "2024-11-18T10:30:00Z"
+                        },
+                        {
+                            "id": 2,
+                            "user": 8,
+                            "total_price": 220.00,
+                            "status": "pending",
+                            "created_at": "2024-11-17T14:15:00Z"
+                        }
+                    ]
+                }
             }
         ),
         400: openapi.Response(
@@ -744,26 +1118,34 @@ def delete_review(request , pk) :
     security=[{"Bearer": []}],
 )
 
-@permission_classes([IsAdminUser])
 @api_view(['GET'])
+@permission_classes([IsAdminUser])
 def get_all_orders(request):
     try:
         order = Order.objects.all()
-        serializer = OrderSerializer(order,many=True)
-        return Response(serializer.data,status=status.HTTP_200_OK)
+        etag,last_modified = validator_for(order,'orders')
+        unchanged = not_modified(request,etag,last_modified)
+        if unchanged:
+            return unchanged
+        try:
+            order = filter_orders(order,request.query_params)
+        except ValueError as ex:
+            return Response({'error':str(ex)},status=status.HTTP_400_BAD_REQUEST)
+        fields,expand = parse_sparse_fields(request.query_params)
+        order = OrderSerializer.setup_eager_loading(order,fields,expand)
+        if wants_stream(request):
+            response = stream_serialized(request,order.order_by('id'),OrderSerializer,fields=fields,expand=expand)
+        else:
+            paginator = OrderCursorPagination()
+            page = paginator.paginate_queryset(order,request)
+            serializer = OrderSerializer(page,many=True,fields=fields,expand=expand)
+            response = paginator.get_paginated_response(serializer.data)
+        return with_validators(response,etag,last_modified)
     except:
         return Response({'error':'you are not authorized'},status=status.HTTP_400_BAD_REQUEST)
 
-class OrderAuthentication(BasePermission):
-    def has_permission(self,request,view):
-        pk = view.kwargs['pk']
-        order = Order.objects.get(id = pk)
-        user_id = order.user.id
-        user = request.user
-        if user_id == user.id:
-            return True
-        else:
-            return False
+class OrderAuthentication(OwnerPermission):
+    queryset = Order.objects.all()
 
 
 
@@ -784,8 +1166,25 @@ class OrderAuthentication(BasePermission):
             type=openapi.TYPE_INTEGER,
             required=True,
         ),
+        openapi.Parameter(
+            'fields',
+            openapi.IN_QUERY,
+            description="Comma separated list of order fields to return, e.g. `id,name,price`; all fields when omitted",
+            type=openapi.TYPE_STRING,
+            required=False,
+        ),
+        openapi.Parameter(
+            'expand',
+            openapi.IN_QUERY,
+            description="Comma separated list of embeds to include alongside `fields` (`user_data`, `shipping_address`, `order_items`)",
+            type=openapi.TYPE_STRING,
+            required=False,
+        ),
     ],
     responses={
+        304: openapi.Response(
+            description="Not Modified - The ETag in If-None-Match (or the If-Modified-Since date) still matches",
+        ),
         200: openapi.Response(
             description="Order details successfully retrieved",
             examples={
@@ -822,14 +1221,20 @@ class OrderAuthentication(BasePermission):
 @permission_classes([IsAuthenticated])
 def get_order_by_id(request, pk):
     try:
-        order = Order.objects.get(id=pk)
-        if request.user == order.user or request.user.is_staff:
-            serializer = OrderSerializer(order)
-            return Response(serializer.data, status=status.HTTP_200_OK)
+        fields, expand = parse_sparse_fields(request.query_params)
+        order = load_object(request, OrderSerializer.setup_eager_loading(Order.objects.all(), fields, expand, prefetch=False), pk)
+        if request.user.id == order.user_id or request.user.is_staff:
+            etag, last_modified = object_validator(f'order-{pk}', order.updated_at)
+            unchanged = not_modified(request, etag, last_modified)
+            if unchanged:
+                return unchanged
+            OrderSerializer.prefetch_embeds([order], fields, expand)
+            serializer = OrderSerializer(order, fields=fields, expand=expand)
+            return with_validators(Response(serializer.data, status=status.HTTP_200_OK), etag, last_modified)
         else:
             return Response({'detail': 'Not authorized to view this order'}, status=status.HTTP_406_NOT_ACCEPTABLE)
 
-    except Order.DoesNotExist:
+    except Http404:
         return Response({'detail': 'Order not found'}, status=status.HTTP_404_NOT_FOUND)
 
         
@@ -875,14 +1280,19 @@ def get_order_by_id(request, pk):
     },
     security=[{"Bearer": []}],
 )
-@permission_classes([OrderAuthentication])
 @api_view(['PUT'])
+@permission_classes([OrderAuthentication])
 def UpdateOrderToPaid(request,pk):
     try:
-        order = Order.objects.get(id = pk)
-        order.is_paid = True
-        order.paid_at = datetime.now()
-        order.save()
+        order = load_object(request,Order.objects.all(),pk)
+        now = timezone.now()
+        with transaction.atomic():
+            # the guard on is_paid makes a concurrent second request a no-op
+            if Order.objects.filter(id = pk,is_paid = False).update(is_paid = True,paid_at = now,updated_at = now):
+                order.is_paid = True
+                order.paid_at = now
+                record_order_paid(order)
+                publish_order_event(order)
         return Response({'details':'updated successfully'},status=status.HTTP_200_OK)
     except Exception as ex:
         return Response({'error':f'{str(ex)}'},status=status.HTTP_404_NOT_FOUND)
@@ -937,16 +1347,19 @@ def UpdateOrderToPaid(request,pk):
     },
     security=[{"Bearer": []}],
 )
-@permission_classes([IsAdminUser])
 @api_view(['PUT'])
+@permission_classes([IsAdminUser])
 def UpdateOrderToDelievered(request,pk):
     try:
-        order = Order.objects.get(id = pk)
-        order.is_delivered = True
-        order.delivered_at = datetime.now()
-        order.save()
+        with transaction.atomic():
+            order = Order.objects.select_for_update().get(id = pk)
+            if not order.is_delivered:
+                order.is_delivered = True
+                order.delivered_at = timezone.localdate()
+                order.save()
+                publish_order_event(order)
         return Response({'details':'delievered successfully'},status=status.HTTP_200_OK)
-    except Order.DoesNotExist:
+    except Order.DoesNotExist as ex:
         return Response({'error':f'{str(ex)}'},status=status.HTTP_404_NOT_FOUND)
     except Exception as ex:
         return Response({'error':f'{str(ex)}'},status=status.HTTP_400_BAD_REQUEST)
@@ -960,22 +1373,103 @@ def UpdateOrderToDelievered(request,pk):
     operation_summary="Get all orders for the authenticated user",
     operation_description=(
         "This endpoint allows authenticated users to retrieve all orders associated with their account. "
-        "The response contains a list of orders placed by the authenticated user."
+        "The response contains a list of orders placed by the authenticated user. "
+        f"Only orders from the last {RECENT_ORDERS_WINDOW.days} days are listed unless `history` is true; "
+        "old delivered orders that have been archived are listed with `archived=true`."
     ),
+    manual_parameters=[
+        openapi.Parameter(
+            'cursor',
+            openapi.IN_QUERY,
+            description="Opaque cursor taken from the `next` or `previous` link of a previous page",
+            type=openapi.TYPE_STRING,
+            required=False,
+        ),
+        openapi.Parameter(
+            'page_size',
+            openapi.IN_QUERY,
+            description="Number of orders per page (default 20, max 100)",
+            type=openapi.TYPE_INTEGER,
+            required=False,
+        ),
+        openapi.Parameter(
+            'is_paid',
+            openapi.IN_QUERY,
+            description="Only paid (true) or unpaid (false) orders",
+            type=openapi.TYPE_BOOLEAN,
+            required=False,
+        ),
+        openapi.Parameter(
+            'is_delivered',
+            openapi.IN_QUERY,
+            description="Only delivered (true) or undelivered (false) orders",
+            type=openapi.TYPE_BOOLEAN,
+            required=False,
+        ),
+        openapi.Parameter(
+            'created_after',
+            openapi.IN_QUERY,
+            description="Only orders placed on or after this date/datetime (ISO 8601)",
+            type=openapi.TYPE_STRING,
+            required=False,
+        ),
+        openapi.Parameter(
+            'created_before',
+            openapi.IN_QUERY,
+            description="Only orders placed on or before this date/datetime (ISO 8601)",
+            type=openapi.TYPE_STRING,
+            required=False,
+        ),
+        openapi.Parameter(
+            'history',
+            openapi.IN_QUERY,
+            description=f"Include orders older than {RECENT_ORDERS_WINDOW.days} days (only recent orders are listed by default)",
+            type=openapi.TYPE_BOOLEAN,
+            required=False,
+        ),
+        openapi.Parameter(
+            'archived',
+            openapi.IN_QUERY,
+            description="List the archived (old, delivered) orders instead; `fields` and `expand` don't apply to them",
+            type=openapi.TYPE_BOOLEAN,
+            required=False,
+        ),
+        openapi.Parameter(
+            'fields',
+            openapi.IN_QUERY,
+            description="Comma separated list of order fields to return, e.g. `id,name,price`; all fields when omitted",
+            type=openapi.TYPE_STRING,
+            required=False,
+        ),
+        openapi.Parameter(
+            'expand',
+            openapi.IN_QUERY,
+            description="Comma separated list of embeds to include alongside `fields` (`user_data`, `shipping_address`, `order_items`)",
+            type=openapi.TYPE_STRING,
+            required=False,
+        ),
+    ],
     responses={
+        304: openapi.Response(
+            description="Not Modified - The ETag in If-None-Match (or the If-Modified-Since date) still matches",
+        ),
         200: openapi.Response(
             description="List of orders retrieved successfully",
             examples={
-                "application/json": [
-                    {
-                        "id": 1,
-                        "user": 5,
-                        "total_price": 150.00,
-                        "status": "completed",
-                        "created_at": "2024-11-18T10:30:00Z",
-                        "updated_at": "2024-11-18T12:00:00Z"
-                    }
-                ]
+                "application/json": {
+                    "next": "http://example.com/api/get_my_orders?cursor=cD0yMDI0LTExLTE4",
+                    "previous": None,
+                    "results": [
+                        {
+                            "id": 1,
+                            "user": 5,
+                            "total_price": 150.00,
+                            "status": "completed",
+                            "created_at": "2024-11-18T10:30:00Z",
+                            "updated_at": "2024-11-18T12:00:00Z"
+                        }
+                    ]
+                }
             }
         ),
         400: openapi.Response(
@@ -991,12 +1485,38 @@ def UpdateOrderToDelievered(request,pk):
 )
 
 @api_view(['GET'])
+@authentication_classes([TokenUserAuthentication])
 @permission_classes([IsAuthenticated])
 def get_my_orders(request):
     try:
-        order = Order.objects.filter(user = request.user)
-        serializer = OrderSerializer(order,many=True)
-        return Response(serializer.data,status=status.HTTP_200_OK)
+        try:
+            archived = wants_archive(request.query_params)
+            if archived:
+                order = ArchivedOrder.objects.filter(user_id = request.user.id)
+                prefix = f'archived-orders-user-{request.user.id}'
+            else:
+                order = recent_orders(Order.objects.filter(user_id = request.user.id),request.query_params)
+                prefix = f'orders-user-{request.user.id}'
+        except ValueError as ex:
+            return Response({'error':str(ex)},status=status.HTTP_400_BAD_REQUEST)
+        etag,last_modified = validator_for(order,prefix)
+        unchanged = not_modified(request,etag,last_modified)
+        if unchanged:
+            return unchanged
+        try:
+            order = filter_orders(order,request.query_params)
+        except ValueError as ex:
+            return Response({'error':str(ex)},status=status.HTTP_400_BAD_REQUEST)
+        paginator = OrderCursorPagination()
+        if archived:
+            page = paginator.paginate_queryset(order.prefetch_related('items'),request)
+            serializer = ArchivedOrderSerializer(page,many=True)
+            return with_validators(paginator.get_paginated_response(serializer.data),etag,last_modified)
+        fields,expand = parse_sparse_fields(request.query_params)
+        order = OrderSerializer.setup_eager_loading(order,fields,expand)
+        page = paginator.paginate_queryset(order,request)
+        serializer = OrderSerializer(page,many=True,fields=fields,expand=expand)
+        return with_validators(paginator.get_paginated_response(serializer.data),etag,last_modified)
     except:
         return Response({'error':'you are not authorized'},status=status.HTTP_400_BAD_REQUEST)
 
@@ -1015,6 +1535,15 @@ def get_my_orders(request):
         "against the products in the system and stock is adjusted accordingly. "
         "A new order is created, and the total price is calculated after deducting the tax price."
     ),
+    manual_parameters=[
+        openapi.Parameter(
+            'Idempotency-Key',
+            openapi.IN_HEADER,
+            description="Optional unique key for this checkout; retries with the same key return the original response instead of placing another order",
+            type=openapi.TYPE_STRING,
+            required=False,
+        ),
+    ],
     request_body=openapi.Schema(
         type=openapi.TYPE_OBJECT,
         properties={
@@ -1082,6 +1611,20 @@ def get_my_orders(request):
                 }
             }
         ),
+        422: openapi.Response(
+            description="Unprocessable Entity - The Idempotency-Key was already used with a different request body",
+        ),
+        409: openapi.Response(
+            description="Conflict - Some items don't have enough stock; nothing was ordered",
+            examples={
+                "application/json": {
+                    "detail": "Insufficient stock",
+                    "items": [
+                        {"product": "Product 1", "requested": 3, "available": 1}
+                    ]
+                }
+            }
+        ),
         404: openapi.Response(
             description="Product Not Found - A product mentioned in the order does not exist",
             examples={
@@ -1095,6 +1638,7 @@ def get_my_orders(request):
 )
 @api_view(['POST'])
 @permission_classes([IsAuthenticated])
+@idempotent
 def addOrderItems(request):
     try:
         user = request.user
@@ -1103,48 +1647,470 @@ def addOrderItems(request):
         order_items = data.get('order_items')
         if not order_items:
             return Response({'detail': 'No order items provided'}, status=status.HTTP_400_BAD_REQUEST)
+        for item in order_items:
+            quantity = item.get('quantity')
+            if not isinstance(quantity, int) or isinstance(quantity, bool) or quantity < 1:
+                return Response({'detail': f'Quantity of {item.get("product")} must be a whole number of at least 1'}, status=status.HTTP_400_BAD_REQUEST)
 
-        # Create Order
-        order = Order.objects.create(
-            user=user,
-            payment_method=data.get('payment_method'),
-            tax_price=data.get('tax_price'),
-            shipping_price=data.get('shipping_price', 50),  # Default to 50 if not provided
-        )
-
-        # Create Shipping Address
-        ShippingAddress.objects.create(
-            order=order,
-            country=data['shipping_address']['country'],
-            city=data['shipping_address']['city'],
-            postal_code=data['shipping_address']['postal_code']
-        )
-        total_price = 0
-
+        # Resolve every product in one query; duplicate lines for the same product are merged for the stock update
+        names = {item['product'] for item in order_items}
+        products = Product.objects.in_bulk(names, field_name='name')
         for item in order_items:
-            try:
-                product = Product.objects.get(name=item['product'])
-            except Product.DoesNotExist:
+            if item['product'] not in products:
                 return Response({'detail': f'Product with name {item["product"]} not found'}, status=status.HTTP_404_NOT_FOUND)
 
-            item_total = item['quantity'] * item['price']
-            total_price += item_total
+        quantities = {}
+        for item in order_items:
+            product_id = products[item['product']].id
+            quantities[product_id] = quantities.get(product_id, 0) + item['quantity']
 
-            order_item = OrderItem.objects.create(
-                order=order,
-                quantity=item['quantity'],
-                price=item['price']
-            )
-            order_item.product.add(product)
+        lines = [(products[item['product']], item['quantity'], item['price']) for item in order_items]
+        with transaction.atomic():
+            order = create_order(user, data, lines)
 
-            product.count_in_stock -= item['quantity']
-            product.save()
+            # last, so the product row locks are held for as short a time as possible
+            reserve_stock(quantities)
+            # the daily rollup rows are shared with other checkouts of the day, so they are touched after everything else
+            record_order_placed(order, lines)
 
-        order.total_price = total_price - order.tax_price
-        order.save()
+        for product_id in quantities:
+            invalidate_product(product_id)
 
+        order = OrderSerializer.setup_eager_loading(Order.objects.all()).get(id=order.id)
         serializer = OrderSerializer(order, many=False)
         return Response(serializer.data, status=status.HTTP_201_CREATED)
 
+    except InsufficientStock as ex:
+        return Response({'detail': 'Insufficient stock', 'items': ex.shortages}, status=status.HTTP_409_CONFLICT)
     except Exception as ex:
         return Response({'error': f'{str(ex)}'}, status=status.HTTP_400_BAD_REQUEST)
+
+
+
+@swagger_auto_schema(
+    method='get',
+    operation_summary="Sales report",
+    operation_description=(
+        "This endpoint allows administrators to see orders, units sold, revenue and average order value "
+        "between two dates, grouped by day, product or category. It reads the daily sales rollups that are "
+        "updated as orders are placed and paid, so it does not scan the orders themselves. "
+        "Revenue is the sum of the ordered lines (quantity * unit price)."
+    ),
+    manual_parameters=[
+        openapi.Parameter(
+            'from',
+            openapi.IN_QUERY,
+            description="First day of the report (YYYY-MM-DD), defaults to 29 days before `to`",
+            type=openapi.TYPE_STRING,
+            format=openapi.FORMAT_DATE,
+        ),
+        openapi.Parameter(
+            'to',
+            openapi.IN_QUERY,
+            description="Last day of the report (YYYY-MM-DD), defaults to today",
+            type=openapi.TYPE_STRING,
+            format=openapi.FORMAT_DATE,
+        ),
+        openapi.Parameter(
+            'group',
+            openapi.IN_QUERY,
+            description="How to group the rows",
+            type=openapi.TYPE_STRING,
+            enum=list(ROLLUP_GROUPS),
+            default='day',
+        ),
+    ],
+    responses={
+        200: openapi.Response(
+            description="Report rows",
+            examples={
+                "application/json": {
+                    "from": "2024-10-01",
+                    "to": "2024-10-30",
+                    "group": "day",
+                    "results": [
+                        {
+                            "day": "2024-10-01",
+                            "orders": 12,
+                            "units": 30,
+                            "revenue": 5400.0,
+                            "paid_orders": 9,
+                            "paid_revenue": 4100.0,
+                            "average_order_value": 450.0
+                        }
+                    ]
+                }
+            },
+        ),
+        400: openapi.Response(
+            description="Bad Request - malformed dates or unknown group",
+            examples={
+                "application/json": {
+                    "error": "group must be one of day, product, category"
+                }
+            },
+        ),
+    },
+    security=[{"Bearer": []}],
+)
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+def get_sales_report(request):
+    try:
+        start,end,group = parse_report_params(request.query_params)
+    except ValueError as ex:
+        return Response({'error':f'{str(ex)}'},status=status.HTTP_400_BAD_REQUEST)
+    return Response({
+        'from':start,
+        'to':end,
+        'group':group,
+        'results':sales_report(start,end,group),
+    },status=status.HTTP_200_OK)
+
+
+
+
+
+CART_EXAMPLE = {
+    "id": 1,
+    "lines": [
+        {
+            "id": 3,
+            "product": 7,
+            "product_name": "Product 1",
+            "quantity": 2,
+            "unit_price": 50.0,
+            "line_total": 100.0
+        }
+    ],
+    "subtotal": 100.0,
+    "item_count": 2,
+    "expires_at": "2024-11-18T10:45:00Z",
+    "created_at": "2024-11-18T10:00:00Z",
+    "updated_at": "2024-11-18T10:30:00Z"
+}
+
+
+@swagger_auto_schema(
+    method='get',
+    operation_summary="Get my cart",
+    operation_description=(
+        "This endpoint returns the authenticated user's cart with its lines, the cached line totals and "
+        "`expires_at`, until which the stock of the lines is held for the user. "
+        "When `expires_at` is null the stock is not held; it is reserved again on the next change or at checkout."
+    ),
+    responses={
+        200: openapi.Response(description="The cart",examples={"application/json": CART_EXAMPLE}),
+    },
+    security=[{"Bearer": []}],
+)
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def get_cart(request):
+    serializer = CartSerializer(carts.get_cart(request.user),many=False)
+    return Response(serializer.data,status=status.HTTP_200_OK)
+
+
+@swagger_auto_schema(
+    method='put',
+    operation_summary="Set the quantity of a product in my cart",
+    operation_description=(
+        "This endpoint sets how many of a product are in the authenticated user's cart, priced at the product's "
+        f"current price, and holds that stock for {CART_RESERVATION_TTL.seconds // 60} minutes from the last change. "
+        "A quantity of 0 removes the product."
+    ),
+    manual_parameters=[
+        openapi.Parameter(
+            'pk',
+            openapi.IN_PATH,
+            description="The ID of the product",
+            type=openapi.TYPE_INTEGER,
+            required=True,
+        ),
+    ],
+    request_body=openapi.Schema(
+        type=openapi.TYPE_OBJECT,
+        properties={
+            'quantity': openapi.Schema(type=openapi.TYPE_INTEGER, description="New quantity, 0 to remove the product"),
+        },
+        required=['quantity'],
+    ),
+    responses={
+        200: openapi.Response(description="The updated cart",examples={"application/json": CART_EXAMPLE}),
+        400: openapi.Response(
+            description="Bad Request - quantity is missing or negative",
+            examples={
+                "application/json": {
+                    "error": "quantity must be a whole number of at least 0"
+                }
+            }
+        ),
+        404: openapi.Response(description="Not Found - The product does not exist"),
+        409: openapi.Response(
+            description="Conflict - Not enough stock; the cart is unchanged",
+            examples={
+                "application/json": {
+                    "detail": "Insufficient stock",
+                    "items": [
+                        {"product": "Product 1", "requested": 3, "available": 1}
+                    ]
+                }
+            }
+        ),
+    },
+    security=[{"Bearer": []}],
+)
+@api_view(['PUT'])
+@permission_classes([IsAuthenticated])
+def update_cart_item(request,pk):
+    quantity = request.data.get('quantity')
+    if not isinstance(quantity,int) or isinstance(quantity,bool) or quantity < 0:
+        return Response({'error':'quantity must be a whole number of at least 0'},status=status.HTTP_400_BAD_REQUEST)
+    try:
+        carts.set_line(request.user,pk,quantity)
+    except Product.DoesNotExist:
+        return Response({'error':'product not found'},status=status.HTTP_404_NOT_FOUND)
+    except InsufficientStock as ex:
+        return Response({'detail':'Insufficient stock','items':ex.shortages},status=status.HTTP_409_CONFLICT)
+    serializer = CartSerializer(carts.get_cart(request.user),many=False)
+    return Response(serializer.data,status=status.HTTP_200_OK)
+
+
+@swagger_auto_schema(
+    method='delete',
+    operation_summary="Empty my cart",
+    operation_description="This endpoint removes every line from the authenticated user's cart and gives back the stock it held.",
+    responses={
+        200: openapi.Response(description="The emptied cart"),
+    },
+    security=[{"Bearer": []}],
+)
+@api_view(['DELETE'])
+@permission_classes([IsAuthenticated])
+def clear_cart(request):
+    carts.clear_cart(request.user)
+    serializer = CartSerializer(carts.get_cart(request.user),many=False)
+    return Response(serializer.data,status=status.HTTP_200_OK)
+
+
+@swagger_auto_schema(
+    method='post',
+    operation_summary="Check out my cart",
+    operation_description=(
+        "This endpoint turns the authenticated user's cart into an order at the cart's prices and empties the cart. "
+        "The stock is already held by the cart, so nothing is looked up again unless the hold expired, "
+        "in which case the stock is reserved again first. If a product's price changed since it was put "
+        "in the cart, the cart is re-priced and nothing is ordered; checking out again orders at the new prices."
+    ),
+    manual_parameters=[
+        openapi.Parameter(
+            'Idempotency-Key',
+            openapi.IN_HEADER,
+            description="Optional unique key for this checkout; retries with the same key return the original response instead of placing another order",
+            type=openapi.TYPE_STRING,
+            required=False,
+        ),
+    ],
+    request_body=openapi.Schema(
+        type=openapi.TYPE_OBJECT,
+        properties={
+            'payment_method': openapi.Schema(type=openapi.TYPE_STRING, description="Method of payment (visa, cash or fawry)"),
+            'tax_price': openapi.Schema(type=openapi.TYPE_NUMBER, description="Tax price applied to the order"),
+            'shipping_price': openapi.Schema(type=openapi.TYPE_NUMBER, description="Shipping price for the order"),
+            'shipping_address': openapi.Schema(
+                type=openapi.TYPE_OBJECT,
+                properties={
+                    'country': openapi.Schema(type=openapi.TYPE_STRING, description="Shipping country"),
+                    'city': openapi.Schema(type=openapi.TYPE_STRING, description="Shipping city"),
+                    'postal_code': openapi.Schema(type=openapi.TYPE_STRING, description="Shipping postal code"),
+                },
+                description="Shipping address for the order"
+            ),
+        },
+        required=['payment_method', 'tax_price', 'shipping_address']
+    ),
+    responses={
+        201: openapi.Response(description="Order created successfully, same body as placeorder"),
+        400: openapi.Response(
+            description="Bad Request - The cart is empty or the request is missing data",
+            examples={
+                "application/json": {
+                    "error": "The cart is empty"
+                }
+            }
+        ),
+        409: openapi.Response(
+            description="Conflict - The hold expired and some items no longer have enough stock, or prices changed and the cart was re-priced; nothing was ordered",
+            examples={
+                "application/json": {
+                    "detail": "Prices changed",
+                    "items": [
+                        {"product": "Product 1", "old_price": 5.0, "price": 7.5}
+                    ]
+                }
+            }
+        ),
+        422: openapi.Response(
+            description="Unprocessable Entity - The Idempotency-Key was already used with a different request body",
+        ),
+    },
+    security=[{"Bearer": []}],
+)
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+@idempotent
+def checkout_cart(request):
+    try:
+        order = carts.checkout_cart(request.user,request.data)
+    except InsufficientStock as ex:
+        return Response({'detail':'Insufficient stock','items':ex.shortages},status=status.HTTP_409_CONFLICT)
+    except carts.PricesChanged as ex:
+        return Response({'detail':'Prices changed','items':ex.changes},status=status.HTTP_409_CONFLICT)
+    except Exception as ex:
+        return Response({'error':f'{str(ex)}'},status=status.HTTP_400_BAD_REQUEST)
+    order = OrderSerializer.setup_eager_loading(Order.objects.all()).get(id = order.id)
+    serializer = OrderSerializer(order,many=False)
+    return Response(serializer.data,status=status.HTTP_201_CREATED)
+
+
+
+def _bulk_transition_response(request,action):
+    ids = request.data.get('ids')
+    filters = request.data.get('filter')
+    if (ids is None) == (filters is None):
+        return Response({'error':'send either ids or filter'},status=status.HTTP_400_BAD_REQUEST)
+    if ids is not None:
+        if not isinstance(ids,list) or not all(isinstance(order_id,int) and not isinstance(order_id,bool) for order_id in ids):
+            return Response({'error':'ids must be a list of order ids'},status=status.HTTP_400_BAD_REQUEST)
+        if len(ids) > BULK_TRANSITION_LIMIT:
+            return Response({'error':f'at most {BULK_TRANSITION_LIMIT} ids per request'},status=status.HTTP_400_BAD_REQUEST)
+    elif not isinstance(filters,dict):
+        return Response({'error':'filter must be an object'},status=status.HTTP_400_BAD_REQUEST)
+    else:
+        filters = {key:str(value).lower() if isinstance(value,bool) else str(value) for key,value in filters.items()}
+    try:
+        results,audit = bulk_transition(action,request.user,ids,filters)
+    except ValueError as ex:
+        return Response({'error':str(ex)},status=status.HTTP_400_BAD_REQUEST)
+    return Response({
+        'audit':audit.id,
+        'updated':len(audit.order_ids),
+        'results':[{'id':order_id,'status':result} for order_id,result in results.items()],
+    },status=status.HTTP_200_OK)
+
+
+def _bulk_transition_schema(action,flag,stamp_field):
+    return swagger_auto_schema(
+        method='post',
+        operation_summary=f"Mark many orders {action}",
+        operation_description=(
+            f"This endpoint allows admin users to mark many orders {action} at once, either the orders listed "
+            f"in `ids` (at most {BULK_TRANSITION_LIMIT}) or those matching `filter` (the order listing filters "
+            f"`is_paid`, `is_delivered`, `created_after` and `created_before`, at most {BULK_TRANSITION_LIMIT} orders). "
+            f"Every order not {action} yet gets `{flag}` set and `{stamp_field}` stamped by a single update, "
+            "and the request is recorded as one audit entry. The result of every id is reported."
+        ),
+        request_body=openapi.Schema(
+            type=openapi.TYPE_OBJECT,
+            properties={
+                'ids':openapi.Schema(type=openapi.TYPE_ARRAY,items=openapi.Schema(type=openapi.TYPE_INTEGER),
+                                     description="Ids of the orders to update"),
+                'filter':openapi.Schema(type=openapi.TYPE_OBJECT,
+                                        description="Order filters, used instead of `ids`, e.g. {\"is_paid\": true, \"created_before\": \"2024-11-01\"}"),
+            },
+        ),
+        responses={
+            200: openapi.Response(
+                description="Per-order results",
+                examples={
+                    "application/json": {
+                        "audit": 12,
+                        "updated": 1,
+                        "results": [
+                            {"id": 1, "status": "updated"},
+                            {"id": 2, "status": f"already_{action}"},
+                            {"id": 3, "status": "not_found"}
+                        ]
+                    }
+                },
+            ),
+            400: openapi.Response(
+                description="Bad Request - neither or both of ids and filter, too many ids, or an empty, unknown or malformed filter",
+                examples={
+                    "application/json": {
+                        "error": "send either ids or filter"
+                    }
+                },
+            ),
+            403: openapi.Response(
+                description="Forbidden - The user is not an admin",
+            ),
+        },
+        security=[{"Bearer": []}],
+    )
+
+
+@_bulk_transition_schema('paid','is_paid','paid_at')
+@api_view(['POST'])
+@permission_classes([IsAdminUser])
+def bulk_mark_orders_paid(request):
+    return _bulk_transition_response(request,'paid')
+
+
+@_bulk_transition_schema('delivered','is_delivered','delivered_at')
+@api_view(['POST'])
+@permission_classes([IsAdminUser])
+def bulk_mark_orders_delivered(request):
+    return _bulk_transition_response(request,'delivered')
+
+
+
+# seconds between SSE comment lines, so proxies don't drop an idle stream
+ORDER_EVENTS_KEEPALIVE = 15
+
+
+def _authenticate_jwt(request):
+    try:
+        result = CachedJWTAuthentication().authenticate(request)
+    except (InvalidToken,AuthenticationFailed):
+        return None
+    return result[0] if result else None
+
+
+async def order_events_stream(request):
+    """Server-Sent Events stream of the caller's order status changes (paid / delivered).
+
+    A plain async Django view rather than an @api_view: it must be served by ecommerce.asgi
+    so that an open stream only costs an idle connection instead of a worker thread.
+    Authenticates with the same `Authorization: Bearer <access token>` header as the API,
+    and `?order=<id>` narrows the stream to one order. Each event looks like
+    `event: order` / `data: {"order": 1, "user": 5, "is_paid": true, "paid_at": "...", ...}`.
+    """
+    user = await sync_to_async(_authenticate_jwt)(request)
+    if user is None:
+        return JsonResponse({'detail':'Authentication credentials were not provided or are invalid.'},status=401)
+    order_id = request.GET.get('order')
+    if order_id is not None:
+        if not order_id.isdigit():
+            return JsonResponse({'error':'order must be an order id'},status=400)
+        order_id = int(order_id)
+    queue = order_events.subscribe(user.id)
+
+    async def stream():
+        try:
+            yield 'retry: 5000\n\n'
+            while True:
+                try:
+                    event = await asyncio.wait_for(queue.get(),ORDER_EVENTS_KEEPALIVE)
+                except asyncio.TimeoutError:
+                    yield ': keepalive\n\n'
+                    continue
+                if order_id is None or event['order'] == order_id:
+                    yield f'event: order\ndata: {json.dumps(event,cls=DjangoJSONEncoder)}\n\n'
+        finally:
+            order_events.unsubscribe(user.id,queue)
+
+    response = StreamingHttpResponse(stream(),content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response